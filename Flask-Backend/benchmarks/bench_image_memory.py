@@ -0,0 +1,86 @@
+# bench_image_memory.py — peak RSS of the IA image decode path, old vs streamed/draft
+# Usage: python benchmarks/bench_image_memory.py [--width 12000 --height 9000 --max-dim 4096]
+# Imports main.py; clients are created lazily, so no Firebase/Gemini credentials are needed.
+
+import argparse, io, multiprocessing as mp, os, sys, tempfile, time
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import main  # noqa: E402
+
+
+def _vm_kb(field: str) -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def _reset_peak():
+    # Linux: writing 5 resets VmHWM to the current RSS.
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _legacy(path: str, max_dim: int) -> Image.Image:
+    # Previous behaviour: whole body in memory, full decode, then resize.
+    with open(path, "rb") as f:
+        data = f.read()
+    img = Image.open(io.BytesIO(data)).convert("RGB")
+    return main._resize_if_needed(img, max_dim=max_dim)
+
+
+def _streamed(path: str, max_dim: int) -> Image.Image:
+    with open(path, "rb") as f:
+        return main.decode_image(f, max_dim=max_dim)
+
+
+def _measure(name: str, path: str, max_dim: int, q: "mp.Queue"):
+    _reset_peak()
+    base = _vm_kb("VmRSS")
+    t0 = time.perf_counter()
+    img = {"legacy": _legacy, "streamed": _streamed}[name](path, max_dim)
+    elapsed = time.perf_counter() - t0
+    q.put((name, img.size, (_vm_kb("VmHWM") - base) / 1024.0, elapsed))
+
+
+def make_source(width: int, height: int) -> str:
+    rng = np.random.default_rng(0)
+    small = (rng.random((height // 64 + 1, width // 64 + 1, 3)) * 255).astype("uint8")
+    img = Image.fromarray(small).resize((width, height), Image.BILINEAR)
+    fd, path = tempfile.mkstemp(suffix=".jpg")
+    with os.fdopen(fd, "wb") as f:
+        img.save(f, format="JPEG", quality=90)
+    return path
+
+
+def main_cli():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--width", type=int, default=12000)
+    ap.add_argument("--height", type=int, default=9000)
+    ap.add_argument("--max-dim", type=int, default=4096)
+    args = ap.parse_args()
+
+    path = make_source(args.width, args.height)
+    print(f"source: {args.width}x{args.height} JPEG, {os.path.getsize(path) / 1e6:.1f} MB on disk")
+    ctx = mp.get_context("fork")
+    try:
+        for name in ("legacy", "streamed"):
+            q = ctx.Queue()
+            p = ctx.Process(target=_measure, args=(name, path, args.max_dim, q))
+            p.start()
+            res = q.get()
+            p.join()
+            print(f"{res[0]:>9}: out={res[1][0]}x{res[1][1]}  peak_rss_delta={res[2]:8.1f} MB  time={res[3]:.2f}s")
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,109 @@
+# bench_startup.py — cold-start cost: `import main`, time until /health answers, time until /health/ready
+# Usage: python benchmarks/bench_startup.py [--runs 5 --port 7999 --ready-timeout 120 --top 10]
+# Import timing needs no credentials (clients are lazy). Readiness needs the app's real environment.
+
+import argparse, os, re, signal, socket, statistics, subprocess, sys, time, urllib.request
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def _python(code: str, env: dict) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, "-c", code], cwd=APP_DIR, env=env, capture_output=True, text=True)
+
+
+def time_import(env: dict) -> float:
+    out = _python("import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)", env)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr[-2000:])
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def top_imports(env: dict, top: int):
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    out = _python("import main", dict(env, PYTHONPROFILEIMPORTTIME="1"))
+    rows = []
+    for line in out.stderr.splitlines():
+        m = re.match(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)", line)
+        if m and len(m.group(3)) == 3:  # direct imports of main (main itself is indented by 1)
+            rows.append((int(m.group(2)) / 1000.0, m.group(4)))
+    return sorted(rows, reverse=True)[:top]
+
+
+def _get(url: str, timeout: float = 1.0) -> int:
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as r:
+            return r.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return 0
+
+
+def _free_port(preferred: int) -> int:
+    with socket.socket() as s:
+        try:
+            s.bind(("127.0.0.1", preferred))
+        except OSError:
+            s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def time_first_request(env: dict, port: int, ready_timeout: float):
+    env = dict(env, PORT=str(port))
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "main.py"], cwd=APP_DIR, env=env, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    first = ready = None
+    try:
+        deadline = t0 + max(ready_timeout, 60)
+        while time.perf_counter() < deadline and proc.poll() is None:
+            if first is None and _get(f"http://127.0.0.1:{port}/health") == 200:
+                first = time.perf_counter() - t0
+            if first is not None and _get(f"http://127.0.0.1:{port}/health/ready", timeout=ready_timeout) == 200:
+                ready = time.perf_counter() - t0
+                break
+            if first is not None and time.perf_counter() - t0 > ready_timeout:
+                break
+            time.sleep(0.02)
+    finally:
+        os.killpg(proc.pid, signal.SIGTERM)  # debug reloader runs a child process too
+        proc.wait()
+    return first, ready
+
+
+def _fmt(xs):
+    xs = [x for x in xs if x is not None]
+    if not xs:
+        return "n/a"
+    return f"median={statistics.median(xs):.2f}s  min={min(xs):.2f}s  max={max(xs):.2f}s  (n={len(xs)})"
+
+
+def main_cli():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--port", type=int, default=7999)
+    ap.add_argument("--ready-timeout", type=float, default=120)
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--skip-server", action="store_true", help="only measure the import")
+    args = ap.parse_args()
+
+    env = dict(os.environ, LOG_LEVEL=os.environ.get("LOG_LEVEL", "WARNING"))
+    imports = [time_import(env) for _ in range(args.runs)]
+    print(f"import main:          {_fmt(imports)}")
+    print("slowest imports made by main (cumulative):")
+    for ms, name in top_imports(env, args.top):
+        print(f"  {ms:8.1f} ms  {name}")
+
+    if args.skip_server:
+        return
+    firsts, readies = [], []
+    for _ in range(args.runs):
+        first, ready = time_first_request(env, _free_port(args.port), args.ready_timeout)
+        firsts.append(first)
+        readies.append(ready)
+    print(f"first /health 200:    {_fmt(firsts)}")
+    print(f"first /health/ready:  {_fmt(readies)}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,198 @@
+# load_test.py — throughput of the gunicorn serving mode as the worker count grows
+# Usage: python benchmarks/load_test.py [--workers 1,2,4 --threads 4 --duration 10 --client-procs 4
+#                                        --paths "POST /cases/today/start,GET /leaderboard/daily" --port 7998]
+# Each run starts `gunicorn -c gunicorn.conf.py main:app` with WEB_CONCURRENCY=N, waits for /health, then
+# cycles through --paths with keep-alive connections from --client-procs processes, one player identity per
+# connection. The default paths read today's case and leaderboard through the shared cache, so they need the
+# app's real environment and an already generated case (POST /admin/generate-today); --paths /health measures
+# the bare serving stack. Cache hit rates are the hs_cache_lookups_total deltas scraped from /metrics around
+# each measured run. The client shares the machine: on small hosts, keep --client-procs low or run it from
+# another box (--host, --no-server).
+
+import argparse, http.client, itertools, multiprocessing as mp, os, re, signal, socket, statistics, subprocess, sys, threading, time, urllib.request
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def _get(url: str, timeout: float = 1.0) -> int:
+    try:
+        with urllib.request.urlopen(url, timeout=timeout) as r:
+            return r.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return 0
+
+
+def _free_port(preferred: int) -> int:
+    with socket.socket() as s:
+        try:
+            s.bind(("127.0.0.1", preferred))
+        except OSError:
+            s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers: int, threads: int, port: int, timeout: float) -> subprocess.Popen:
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), GUNICORN_THREADS=str(threads), PORT=str(port),
+               LOG_LEVEL=os.environ.get("LOG_LEVEL", "WARNING"))
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--access-logfile", os.devnull, "main:app"],
+                            cwd=APP_DIR, env=env, start_new_session=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline and proc.poll() is None:
+        if _get(f"http://127.0.0.1:{port}/health") == 200:
+            time.sleep(1.0)  # let the remaining workers finish booting
+            return proc
+        time.sleep(0.1)
+    stop_server(proc)
+    raise RuntimeError(f"gunicorn with {workers} workers did not answer /health within {timeout}s")
+
+
+def stop_server(proc: subprocess.Popen) -> None:
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+    proc.wait()
+
+
+def parse_targets(spec: str) -> list:
+    """"POST /a,/b" -> [("POST", "/a"), ("GET", "/b")]."""
+    targets = []
+    for part in spec.split(","):
+        words = part.split()
+        if words:
+            targets.append((words[0].upper(), words[1]) if len(words) > 1 else ("GET", words[0]))
+    return targets
+
+
+_LOOKUP_RE = re.compile(r'^hs_cache_lookups_total\{cache="([^"]*)",result="([^"]*)"\} (\S+)$', re.M)
+
+
+def cache_lookups(host: str, port: int) -> dict:
+    """{(cache, result): count} from /metrics, summed over the workers that have flushed."""
+    try:
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics", timeout=5) as r:
+            text = r.read().decode()
+    except OSError:
+        return {}
+    return {(c, res): float(v) for c, res, v in _LOOKUP_RE.findall(text)}
+
+
+def hit_rates(before: dict, after: dict) -> str:
+    per_cache = {}
+    for (cache, result), v in after.items():
+        per_cache.setdefault(cache, {})[result] = v - before.get((cache, result), 0.0)
+    parts = []
+    for cache, r in sorted(per_cache.items()):
+        total = sum(r.values())
+        if total > 0:
+            hits = r.get("hit", 0) + r.get("shared_hit", 0)
+            parts.append(f"{cache} {hits / total:.1%} of {int(total)} (L2 {r.get('shared_hit', 0) / total:.1%})")
+    return ", ".join(parts) or "no cache lookups"
+
+
+def _client_proc(args):
+    host, port, targets, connections, duration, proc_index = args
+    latencies, errors = [], [0]
+    deadline = time.monotonic() + duration
+
+    def run(conn_index):
+        user = f"load-{proc_index}-{conn_index}"
+        headers = {"Content-Type": "application/json", "X-Reddit-User": user, "X-Reddit-Id": user}
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        for method, path in itertools.cycle(targets):
+            if time.monotonic() >= deadline:
+                break
+            t0 = time.perf_counter()
+            try:
+                conn.request(method, path, body=b"{}" if method == "POST" else None, headers=headers)
+                r = conn.getresponse()
+                r.read()
+                if r.status >= 500:
+                    errors[0] += 1
+                    continue
+                latencies.append(time.perf_counter() - t0)
+            except (OSError, http.client.HTTPException):
+                errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+        conn.close()
+
+    ts = [threading.Thread(target=run, args=(i,), daemon=True) for i in range(connections)]
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    return latencies, errors[0]
+
+
+def drive(host: str, port: int, targets: list, duration: float, procs: int, connections: int) -> dict:
+    per_proc = max(1, connections // procs)
+    with mp.get_context("spawn").Pool(procs) as pool:
+        t0 = time.perf_counter()
+        results = pool.map(_client_proc, [(host, port, targets, per_proc, duration, i) for i in range(procs)])
+        elapsed = time.perf_counter() - t0
+    latencies = sorted(x for lat, _ in results for x in lat)
+    errors = sum(e for _, e in results)
+    if not latencies:
+        return {"rps": 0.0, "p50_ms": None, "p99_ms": None, "errors": errors, "requests": 0}
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / min(elapsed, duration),
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+    }
+
+
+def main_cli():
+    cores = os.cpu_count() or 1
+    default_workers = sorted({1, *(n for n in (2, 4, 8, 16) if n <= cores), cores})
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--workers", default=",".join(map(str, default_workers)))
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--paths", default="POST /cases/today/start,GET /leaderboard/daily",
+                    help='comma-separated "[METHOD] /path" list, cycled per connection')
+    ap.add_argument("--duration", type=float, default=10)
+    ap.add_argument("--warmup", type=float, default=2, help="seconds of unmeasured load before each run")
+    ap.add_argument("--client-procs", type=int, default=max(1, min(cores, 4)))
+    ap.add_argument("--connections", type=int, default=64)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=7998)
+    ap.add_argument("--start-timeout", type=float, default=60)
+    ap.add_argument("--no-server", action="store_true", help="load an already running server at --host:--port")
+    ap.add_argument("--metrics-lag", type=float, default=6,
+                    help="seconds to let workers flush metrics (METRICS_FLUSH_INTERVAL) before each /metrics scrape")
+    args = ap.parse_args()
+    targets = parse_targets(args.paths)
+
+    print(f"cores={cores}  paths={args.paths}  duration={args.duration}s  connections={args.connections}  "
+          f"client_procs={args.client_procs}  threads/worker={args.threads}")
+    print(f"{'workers':>7}  {'req/s':>9}  {'p50 ms':>8}  {'p99 ms':>8}  {'errors':>6}  {'scale':>5}")
+    base = None
+    for n in ([0] if args.no_server else [int(w) for w in args.workers.split(",") if w.strip()]):
+        port = args.port if args.no_server else _free_port(args.port)
+        proc = None if args.no_server else start_server(n, args.threads, port, args.start_timeout)
+        try:
+            if args.warmup > 0:
+                drive(args.host, port, targets, args.warmup, args.client_procs, args.connections)
+            time.sleep(args.metrics_lag)
+            before = cache_lookups(args.host, port)
+            res = drive(args.host, port, targets, args.duration, args.client_procs, args.connections)
+            time.sleep(args.metrics_lag)
+            after = cache_lookups(args.host, port)
+        finally:
+            if proc:
+                stop_server(proc)
+        base = base or res["rps"] or None
+        scale = f"{res['rps'] / base:.2f}x" if base else "n/a"
+        p50 = f"{res['p50_ms']:.1f}" if res["p50_ms"] is not None else "n/a"
+        p99 = f"{res['p99_ms']:.1f}" if res["p99_ms"] is not None else "n/a"
+        print(f"{n or '-':>7}  {res['rps']:>9.0f}  {p50:>8}  {p99:>8}  {res['errors']:>6}  {scale:>5}")
+        print(f"{'':>7}  cache hits: {hit_rates(before, after)}")
+
+
+if __name__ == "__main__":
+    main_cli()
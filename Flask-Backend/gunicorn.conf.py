@@ -0,0 +1,35 @@
+# gunicorn.conf.py — production serving for main.py: `gunicorn -c gunicorn.conf.py main:app`
+# Envs: PORT, WEB_CONCURRENCY (worker processes, default one per core), GUNICORN_THREADS (per worker),
+#       GUNICORN_TIMEOUT, GUNICORN_MAX_REQUESTS
+# The app is imported once in the master (preload_app) together with the client libraries; each worker then
+# builds its own Firebase/Gemini clients after the fork. Case docs, the IA pool index and leaderboard snapshots
+# are shared between workers through SHARED_CACHE_PATH; one worker per host (SERVE_LEADER_LOCK) runs the
+# bootstrap, session sweeper, pre-generator and admin-job loops.
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '7860')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+worker_class = "gthread"
+# gthread: a worker whose main loop is silent this long is killed and restarted. It is a heartbeat, not a
+# per-request limit; a slow request (e.g. generating the case) only blocks its own thread.
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+accesslog = "-"
+preload_app = True
+
+
+def when_ready(server):
+    # Runs in the master before the first fork: imports only, no sockets, threads or clients yet.
+    import main
+    main.preload_libraries()
+
+
+def post_fork(server, worker):
+    import main
+    main.on_worker_fork()
@@ -2,18 +2,43 @@
 # Flask + Firebase Realtime DB + Firebase Storage + Gemini
 # Envs required: FIREBASE, Firebase_DB, Firebase_Storage, Gemini
 # Optional envs: GAME_SALT, ADMIN_KEY, IA_USER_AGENT, MIN_IA_POOL, IA_QUERY,
-#                BOOTSTRAP_IA, LOG_LEVEL, ALLOW_DEV_BOOTSTRAP, ALLOW_DEV_DIAGNOSTICS
-
-import os, io, uuid, json, hmac, hashlib, random, traceback, requests, re, hashlib as _hash
+#                BOOTSTRAP_IA, LOG_LEVEL, ALLOW_DEV_BOOTSTRAP, ALLOW_DEV_DIAGNOSTICS,
+#                CASE_CACHE_TTL, CASE_CACHE_MAX, LEADERBOARD_CACHE_TTL,
+#                SESSION_SWEEP_INTERVAL, SESSION_SWEEP_BATCH, CASE_LEASE_SECONDS, CASE_WARMING_WAIT,
+#                PREGEN_DAYS, PREGEN_INTERVAL, GEMINI_MAX_WORKERS, GEMINI_TIMEOUT, GEMINI_INPUT_MAX_DIM,
+#                GEMINI_META_ATTEMPTS, GEMINI_MAX_RETRIES, GEMINI_BATCH_TIMEOUT, IA_INGEST_WORKERS,
+#                IA_PER_HOST_CONCURRENCY, IA_INGEST_MODE,
+#                IA_METADATA_CACHE_TTL, HTTP_POOL_SIZE, HTTP_MAX_RETRIES, HTTP_BACKOFF_BASE,
+#                IMAGE_MAX_BYTES, IMAGE_MAX_PIXELS, IMAGE_MIN_DIM, CACHE_IO_WORKERS, CACHE_CPU_WORKERS,
+#                CACHE_MP_CONTEXT, IMAGE_DERIVATIVES, DERIVATIVE_JPEG_QUALITY, DERIVATIVE_WEBP_QUALITY, TILE_SIZE,
+#                TILE_MAX_DIM, TILE_JPEG_QUALITY, TILE_UPLOAD_WORKERS, PHASH_MAX_DISTANCE,
+#                HTTP_DISK_CACHE_DIR, HTTP_DISK_CACHE_MAX_BYTES, HTTP_DISK_CACHE_FRESH, HTTP_DISK_CACHE_MMAP_BYTES,
+#                ADMIN_JOB_CONCURRENCY, ADMIN_JOB_LOCK_DIR, ADMIN_JOB_STALE, ADMIN_JOB_CHUNK, SHARED_CACHE_PATH,
+#                SHARED_CACHE_L1_TTL, SERVE_LEADER_LOCK, SERVE_LEADER_RETRY, IA_POOL_INDEX_TTL, FLASK_DEBUG, PORT,
+#                METRICS_FLUSH_INTERVAL, TRACE_SAMPLE_RATE, TRACE_SLOW_MS, TRACE_FILE, TRACE_FILE_MAX_BYTES,
+#                TRACE_FILE_BACKUPS, TRACE_MAX_SPANS
+# Production: gunicorn -c gunicorn.conf.py main:app (see that file for WEB_CONCURRENCY / GUNICORN_THREADS)
+# RTDB rules: deploy database.rules.json (firebase deploy --only database) for the indexes the session sweeper
+#             (sessions by case_id) and the leaderboard refill (plays/$case by score) query on.
+
+import os, io, mmap, importlib, contextlib, contextvars, functools, itertools, uuid, json, gzip, socket, math, tempfile, hmac, hashlib, random, sqlite3, traceback, requests, re, threading, time, bisect, hashlib as _hash
+from collections import OrderedDict, deque
+from urllib.parse import urlparse
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, Future, wait, FIRST_EXCEPTION, FIRST_COMPLETED
 from datetime import datetime, timedelta, timezone
 from typing import Dict, Any, Tuple, List, Optional
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
-from PIL import Image
+from PIL import Image, features
+import numpy as np
 
 # ----- Logging ---------------------------------------------------------------
 import logging
+from logging.handlers import RotatingFileHandler
 LOG_LEVEL = os.environ.get("LOG_LEVEL", "DEBUG").upper()
 logging.basicConfig(
     level=getattr(logging, LOG_LEVEL, logging.DEBUG),
@@ -21,13 +46,8 @@ logging.basicConfig(
 )
 log = logging.getLogger("hidden_stroke")
 
-# ---------------- Firebase Admin (Realtime DB + Storage) ----------------
-import firebase_admin
-from firebase_admin import credentials, db, storage
-
-# ---------------- Gemini (exact client & model names) -------------------
-from google import genai
-from google.genai import types
+# Firebase Admin (Realtime DB + Storage) and Gemini (google-genai) are imported and initialized
+# lazily on first use: together they are most of the import time, and /health must not wait for them.
 
 # -----------------------------------------------------------------------------
 # 1) CONFIG & INIT
@@ -40,45 +60,153 @@ CORS(app,
      allow_headers=["Content-Type", "X-Reddit-User", "X-Reddit-Id"])
 
 
+# --- Lazily constructed clients ---
+class _LazyClient:
+    """Module-level stand-in that builds the real object on first attribute access (once, thread-safe)."""
+
+    def __init__(self, name: str, factory):
+        self._name = name
+        self._factory = factory
+        self._obj = None
+        self._lock = threading.Lock()
+        self.error: Optional[str] = None
+
+    def get(self):
+        if self._obj is None:
+            with self._lock:
+                if self._obj is None:
+                    t0 = time.monotonic()
+                    try:
+                        self._obj = self._factory()
+                    except Exception as e:
+                        self.error = str(e)
+                        log.exception(f"FATAL: {self._name} init failed")
+                        raise
+                    self.error = None
+                    log.info(f"{self._name} initialized in {time.monotonic() - t0:.2f}s")
+        return self._obj
+
+    @property
+    def ready(self) -> bool:
+        return self._obj is not None
+
+    def __getattr__(self, attr):
+        return getattr(self.get(), attr)
+
 # --- Firebase ---
-try:
-    credentials_json_string = os.environ.get("FIREBASE")
-    if not credentials_json_string:
-        raise ValueError("The FIREBASE environment variable is not set.")
-
-    credentials_json = json.loads(credentials_json_string)
-    firebase_db_url = os.environ.get("Firebase_DB")
-    firebase_storage_bucket = os.environ.get("Firebase_Storage")
-    if not firebase_db_url or not firebase_storage_bucket:
-        raise ValueError("Firebase_DB and Firebase_Storage environment variables must be set.")
-
-    cred = credentials.Certificate(credentials_json)
-    firebase_admin.initialize_app(cred, {
-        'databaseURL': firebase_db_url,
-        'storageBucket': firebase_storage_bucket
-    })
-    bucket = storage.bucket()
-    db_root = db.reference("/")
-    log.info("Firebase Realtime DB + Storage initialized.")
-except Exception:
-    log.exception("FATAL: Firebase init failed")
-    raise
+_firebase_app_lock = threading.Lock()
+_firebase_app_ready = False
+
+def _init_firebase_app() -> None:
+    global _firebase_app_ready
+    with _firebase_app_lock:
+        if _firebase_app_ready:
+            return
+        import firebase_admin
+        from firebase_admin import credentials
+
+        credentials_json_string = os.environ.get("FIREBASE")
+        if not credentials_json_string:
+            raise ValueError("The FIREBASE environment variable is not set.")
+
+        credentials_json = json.loads(credentials_json_string)
+        firebase_db_url = os.environ.get("Firebase_DB")
+        firebase_storage_bucket = os.environ.get("Firebase_Storage")
+        if not firebase_db_url or not firebase_storage_bucket:
+            raise ValueError("Firebase_DB and Firebase_Storage environment variables must be set.")
+
+        cred = credentials.Certificate(credentials_json)
+        firebase_admin.initialize_app(cred, {
+            'databaseURL': firebase_db_url,
+            'storageBucket': firebase_storage_bucket
+        })
+        _firebase_app_ready = True
+
+class _TimedRef:
+    """Reference/Query proxy that times every round trip into hs_rtdb_op_duration_seconds (and the current
+    trace), labelled by the top-level path segment; child(), push() and the query builders return proxies too."""
+
+    _OPS = frozenset({"get", "set", "update", "delete", "push", "transaction", "set_if_unchanged"})
+    _BUILDERS = ("order_by_", "limit_to_", "start_at", "end_at", "equal_to")
+
+    def __init__(self, target, prefix: str, query: bool = False):
+        self._target = target
+        self._prefix = prefix
+        self._query = query
+
+    def child(self, path: str) -> "_TimedRef":
+        prefix = self._prefix if self._prefix != "/" else (path.strip("/").split("/")[0] or "/")
+        return _TimedRef(self._target.child(path), prefix)
+
+    def _timed(self, op: str, fn):
+        def call(*args, **kwargs):
+            prefix = self._prefix
+            if prefix == "/" and op == "update" and args:
+                # Root multi-path update (RTDBBatch): label by the set of top-level nodes it touches.
+                prefix = "+".join(sorted({k.strip("/").split("/")[0] for k in args[0]})) or "/"
+            op_label = "query" if self._query else op
+            cur = _trace_span.get()
+            t0 = time.perf_counter()
+            outcome = "error"
+            try:
+                result = fn(*args, **kwargs)
+                outcome = "ok"
+            finally:
+                t1 = time.perf_counter()
+                _rtdb_latency.observe(t1 - t0, op_label, prefix, outcome)
+                if cur is not None:
+                    path = getattr(self._target, "path", None) or prefix
+                    cur[0].add(next(cur[0].ids), cur[1], f"rtdb.{op_label}", t0, t1, {"path": path},
+                               None if outcome == "ok" else "error")
+            return _TimedRef(result, self._prefix) if op == "push" else result
+        return call
+
+    def __getattr__(self, attr):
+        value = getattr(self._target, attr)
+        if attr in self._OPS:
+            return self._timed(attr, value)
+        if attr.startswith(self._BUILDERS):
+            return lambda *a, **k: _TimedRef(value(*a, **k), self._prefix, query=True)
+        return value
+
+def _init_db_root():
+    _init_firebase_app()
+    from firebase_admin import db
+    return _TimedRef(db.reference("/"), "/")
+
+def _init_bucket():
+    _init_firebase_app()
+    from firebase_admin import storage
+    return storage.bucket()
+
+db_root = _LazyClient("Firebase Realtime DB", _init_db_root)
+bucket = _LazyClient("Firebase Storage", _init_bucket)
 
 # --- Gemini ---
-try:
-    GEMINI_API_KEY = os.environ.get("Gemini")
-    if not GEMINI_API_KEY:
+def _init_gemini():
+    gemini_api_key = os.environ.get("Gemini")
+    if not gemini_api_key:
         raise ValueError("The 'Gemini' environment variable is not set.")
-    client = genai.Client(api_key=GEMINI_API_KEY)
-    log.info("Gemini client initialized.")
-except Exception:
-    log.exception("FATAL: Gemini init failed")
-    raise
+    from google import genai
+    return genai.Client(api_key=gemini_api_key)
+
+client = _LazyClient("Gemini client", _init_gemini)
+types = _LazyClient("google.genai.types", lambda: importlib.import_module("google.genai.types"))
+genai_errors = _LazyClient("google.genai.errors", lambda: importlib.import_module("google.genai.errors"))
 
 # --- Models (exact names) ---
 CATEGORY_MODEL = "gemini-2.5-flash"
 #GENERATION_MODEL = "gemini-2.0-flash-exp-image-generation"
-GENERATION_MODEL = "gemini-2.5-flash-image-preview
+GENERATION_MODEL = "gemini-2.5-flash-image-preview"
+
+GEMINI_MAX_WORKERS = int(os.environ.get("GEMINI_MAX_WORKERS", "4"))
+GEMINI_TIMEOUT = float(os.environ.get("GEMINI_TIMEOUT", "120"))       # seconds, per call
+GEMINI_INPUT_MAX_DIM = int(os.environ.get("GEMINI_INPUT_MAX_DIM", "1536"))
+GEMINI_META_ATTEMPTS = int(os.environ.get("GEMINI_META_ATTEMPTS", "3"))     # re-prompts on invalid metadata JSON
+GEMINI_MAX_RETRIES = int(os.environ.get("GEMINI_MAX_RETRIES", "2"))         # per call, on transport errors / 429 / 5xx
+# Deadline for a build's concurrent Gemini stages: room for every retry of a call, not just one attempt.
+GEMINI_BATCH_TIMEOUT = float(os.environ.get("GEMINI_BATCH_TIMEOUT", str(GEMINI_TIMEOUT * (GEMINI_MAX_RETRIES + 1))))
+
 # --- Game constants ---
 TIMER_SECONDS = 90
 INITIAL_IP = 8
@@ -96,6 +224,80 @@ DEFAULT_IA_QUERY = os.environ.get(
 )
 ALLOW_DEV_BOOTSTRAP = os.environ.get("ALLOW_DEV_BOOTSTRAP", "0") == "1"
 ALLOW_DEV_DIAGNOSTICS = os.environ.get("ALLOW_DEV_DIAGNOSTICS", "0") == "1"
+CASE_CACHE_TTL = int(os.environ.get("CASE_CACHE_TTL", "900"))
+CASE_CACHE_MAX = int(os.environ.get("CASE_CACHE_MAX", "64"))
+LEADERBOARD_CACHE_TTL = int(os.environ.get("LEADERBOARD_CACHE_TTL", "5"))
+SESSION_SWEEP_INTERVAL = int(os.environ.get("SESSION_SWEEP_INTERVAL", "0"))  # seconds; 0 = off
+SESSION_SWEEP_BATCH = int(os.environ.get("SESSION_SWEEP_BATCH", "500"))
+CASE_LEASE_SECONDS = int(os.environ.get("CASE_LEASE_SECONDS", "300"))
+CASE_WARMING_WAIT = float(os.environ.get("CASE_WARMING_WAIT", "8"))
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+PREGEN_DAYS = int(os.environ.get("PREGEN_DAYS", "2"))          # today + next N days
+PREGEN_INTERVAL = int(os.environ.get("PREGEN_INTERVAL", "600"))  # seconds; 0 = off
+PREGEN_MAX_BACKOFF = int(os.environ.get("PREGEN_MAX_BACKOFF", "3600"))
+
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "16"))
+HTTP_MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", "4"))
+HTTP_BACKOFF_BASE = float(os.environ.get("HTTP_BACKOFF_BASE", "0.5"))
+HTTP_BACKOFF_MAX = float(os.environ.get("HTTP_BACKOFF_MAX", "30"))
+HTTP_RETRY_STATUSES = {429, 500, 502, 503, 504}
+# On-disk read-through cache for outbound GETs; set HTTP_DISK_CACHE_DIR="" to disable.
+HTTP_DISK_CACHE_DIR = os.environ.get("HTTP_DISK_CACHE_DIR", os.path.join(tempfile.gettempdir(), "hidden_stroke_http"))
+HTTP_DISK_CACHE_MAX_BYTES = int(os.environ.get("HTTP_DISK_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+HTTP_DISK_CACHE_FRESH = int(os.environ.get("HTTP_DISK_CACHE_FRESH", "3600"))  # seconds served without revalidation
+HTTP_DISK_CACHE_MMAP_BYTES = int(os.environ.get("HTTP_DISK_CACHE_MMAP_BYTES", str(1024 * 1024)))  # mmap at/above
+IMAGE_MAX_BYTES = int(os.environ.get("IMAGE_MAX_BYTES", str(100 * 1024 * 1024)))  # hard cap per download
+IMAGE_MAX_PIXELS = int(os.environ.get("IMAGE_MAX_PIXELS", str(150_000_000)))      # refuse bigger sources
+IMAGE_MIN_DIM = int(os.environ.get("IMAGE_MIN_DIM", "800"))  # pool items smaller than this on either side are rejected
+IMAGE_SPOOL_BYTES = 8 * 1024 * 1024  # downloads above this spill to a temp file
+Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS  # keep PIL's bomb check in line with our own guard
+# name:max_dim pairs; every case image is published at each size as progressive JPEG (+ WebP).
+IMAGE_DERIVATIVES = [
+    (name.strip(), int(dim))
+    for name, dim in (part.split(":") for part in os.environ.get("IMAGE_DERIVATIVES", "thumb:320,display:1280,zoom:4096").split(",") if part.strip())
+]
+DERIVATIVE_JPEG_QUALITY = int(os.environ.get("DERIVATIVE_JPEG_QUALITY", "82"))
+DERIVATIVE_WEBP_QUALITY = int(os.environ.get("DERIVATIVE_WEBP_QUALITY", "78"))
+WEBP_SUPPORTED = features.check("webp")
+TILE_SIZE = int(os.environ.get("TILE_SIZE", "256"))
+TILE_MAX_DIM = int(os.environ.get("TILE_MAX_DIM", "4096"))  # top pyramid level is capped to this
+TILE_JPEG_QUALITY = int(os.environ.get("TILE_JPEG_QUALITY", "85"))
+TILE_UPLOAD_WORKERS = int(os.environ.get("TILE_UPLOAD_WORKERS", "16"))
+CACHE_IO_WORKERS = int(os.environ.get("CACHE_IO_WORKERS", "8"))
+CACHE_CPU_WORKERS = int(os.environ.get("CACHE_CPU_WORKERS", "0"))  # 0 = one per core
+CACHE_MP_CONTEXT = os.environ.get("CACHE_MP_CONTEXT", "spawn")   # fork is unsafe in a threaded server
+PHASH_MAX_DISTANCE = int(os.environ.get("PHASH_MAX_DISTANCE", "6"))  # dHash bits; <= this is a near-duplicate
+IA_INGEST_WORKERS = int(os.environ.get("IA_INGEST_WORKERS", "8"))
+# Heavy admin jobs running at once per host: every gunicorn worker takes one of this many flock'd slot files
+# in ADMIN_JOB_LOCK_DIR before running a job, whichever worker accepted it.
+ADMIN_JOB_CONCURRENCY = int(os.environ.get("ADMIN_JOB_CONCURRENCY", "1"))
+ADMIN_JOB_LOCK_DIR = os.environ.get("ADMIN_JOB_LOCK_DIR", tempfile.gettempdir())
+ADMIN_JOB_STALE = int(os.environ.get("ADMIN_JOB_STALE", "120"))  # seconds without heartbeat before a job is resumable
+ADMIN_JOB_HEARTBEAT = max(1.0, ADMIN_JOB_STALE / 4)  # queued and running jobs' leases are refreshed this often
+ADMIN_JOB_CHUNK = int(os.environ.get("ADMIN_JOB_CHUNK", "10"))   # cache items per checkpoint
+# Multi-worker serving (gunicorn.conf.py): caches marked shared=True keep an L2 copy in one sqlite file per host,
+# and a flock'd file picks the single worker that runs the bootstrap and periodic loops. "" disables either.
+SHARED_CACHE_PATH = os.environ.get("SHARED_CACHE_PATH", os.path.join(tempfile.gettempdir(), "hidden_stroke_cache.sqlite3"))
+SHARED_CACHE_L1_TTL = float(os.environ.get("SHARED_CACHE_L1_TTL", "10"))  # cap on per-process staleness
+SERVE_LEADER_LOCK = os.environ.get("SERVE_LEADER_LOCK", os.path.join(tempfile.gettempdir(), "hidden_stroke.leader"))
+SERVE_LEADER_RETRY = int(os.environ.get("SERVE_LEADER_RETRY", "30"))  # seconds between standby lock attempts
+IA_POOL_INDEX_TTL = int(os.environ.get("IA_POOL_INDEX_TTL", "300"))
+METRICS_FLUSH_INTERVAL = int(os.environ.get("METRICS_FLUSH_INTERVAL", "5"))  # seconds; workers' share of /metrics
+# Tracing: a sampled share of requests (plus every case build) records a span tree; traces slower than
+# TRACE_SLOW_MS are appended to a rotating JSONL file (one per worker under gunicorn). TRACE_FILE="" keeps them in memory.
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_SLOW_MS = float(os.environ.get("TRACE_SLOW_MS", "1000"))
+TRACE_FILE = os.environ.get("TRACE_FILE", os.path.join(tempfile.gettempdir(), "hidden_stroke_traces.jsonl"))
+TRACE_FILE_MAX_BYTES = int(os.environ.get("TRACE_FILE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_FILE_BACKUPS = int(os.environ.get("TRACE_FILE_BACKUPS", "5"))
+TRACE_MAX_SPANS = int(os.environ.get("TRACE_MAX_SPANS", "2000"))  # per trace; later spans are only counted
+IA_PER_HOST_CONCURRENCY = int(os.environ.get("IA_PER_HOST_CONCURRENCY", "4"))
+# "fields": ingest straight from advancedsearch fl[] fields, resolve the image file lazily.
+# "metadata": fetch /metadata for every doc at ingest time (previous behaviour).
+IA_INGEST_MODE = os.environ.get("IA_INGEST_MODE", "fields").lower()
+IA_SEARCH_FIELDS = ["identifier", "title", "creator", "date", "rights", "licenseurl", "format"]
+IA_IMAGE_FORMATS = ["jpeg", "jpg", "png", "tiff", "image"]
+IA_METADATA_CACHE_TTL = int(os.environ.get("IA_METADATA_CACHE_TTL", "86400"))
 
 FALLBACK_IA_QUERIES = [
     '(mediatype:image AND (format:JPEG OR format:PNG))',
@@ -109,6 +311,9 @@ FALLBACK_IA_QUERIES = [
 def utc_today_str() -> str:
     return datetime.now(timezone.utc).strftime("%Y%m%d")
 
+def case_id_for_offset(days: int) -> str:
+    return (datetime.now(timezone.utc) + timedelta(days=days)).strftime("%Y%m%d")
+
 def case_ref(case_id: str):
     return db_root.child(f"cases/{case_id}")
 
@@ -118,12 +323,453 @@ def plays_ref(case_id: str):
 def leaderboard_ref(case_id: str):
     return db_root.child(f"leaderboards/{case_id}/top")
 
+def score_hist_ref(case_id: str):
+    return db_root.child(f"leaderboards/{case_id}/hist")
+
 def sessions_ref():
     return db_root.child("sessions")
 
+def session_index_ref(case_id: str):
+    return db_root.child(f"session_index/{case_id}")
+
 def ia_pool_ref():
     return db_root.child("ia_pool")
 
+def ia_phash_ref():
+    # pool_key -> dHash hex of every cached, non-duplicate pool item (the near-duplicate index source)
+    return db_root.child("ia_phash")
+
+# --- Cross-worker cache: JSON values in one sqlite file that every worker process on the host reads ---
+class SharedCache:
+    """Host-wide key/value store with per-entry expiry. WAL mode lets readers run alongside the one writer;
+    connections are opened per thread and per pid, so nothing opened before a fork is reused after it."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self.errors = 0
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=2.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS kv (ns TEXT, k TEXT, v TEXT, expires_at REAL, PRIMARY KEY (ns, k))")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, ns: str, key: str) -> Any:
+        try:
+            row = self._conn().execute("SELECT v, expires_at FROM kv WHERE ns = ? AND k = ?", (ns, key)).fetchone()
+        except sqlite3.Error as e:
+            self.errors += 1
+            log.debug(f"Shared cache read failed ({ns}/{key}): {e}")
+            return None
+        if row is None or row[1] < time.time():
+            return None
+        return json.loads(row[0])
+
+    def put(self, ns: str, key: str, value: Any, ttl: float) -> None:
+        try:
+            conn = self._conn()
+            conn.execute("INSERT OR REPLACE INTO kv VALUES (?, ?, ?, ?)", (ns, key, json.dumps(value), time.time() + ttl))
+            if random.random() < 0.01:
+                conn.execute("DELETE FROM kv WHERE expires_at < ?", (time.time(),))
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            self.errors += 1
+            log.debug(f"Shared cache write failed ({ns}/{key}): {e}")
+
+    def delete(self, ns: str, key: str) -> None:
+        try:
+            self._conn().execute("DELETE FROM kv WHERE ns = ? AND k = ?", (ns, key))
+        except sqlite3.Error as e:
+            self.errors += 1
+            log.debug(f"Shared cache delete failed ({ns}/{key}): {e}")
+
+    def items(self, ns: str) -> List[Tuple[str, Any]]:
+        try:
+            rows = self._conn().execute("SELECT k, v FROM kv WHERE ns = ? AND expires_at >= ?", (ns, time.time())).fetchall()
+        except sqlite3.Error as e:
+            self.errors += 1
+            log.debug(f"Shared cache scan failed ({ns}): {e}")
+            return []
+        return [(k, json.loads(v)) for k, v in rows]
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            rows = self._conn().execute("SELECT ns, COUNT(*) FROM kv WHERE expires_at >= ? GROUP BY ns", (time.time(),)).fetchall()
+            size = os.path.getsize(self.path)
+        except (sqlite3.Error, OSError) as e:
+            return {"path": self.path, "error": str(e), "errors": self.errors}
+        return {"path": self.path, "bytes": size, "entries": dict(rows), "errors": self.errors}
+
+_shared_cache: Optional[SharedCache] = SharedCache(SHARED_CACHE_PATH) if SHARED_CACHE_PATH else None
+
+# --- Metrics: counters and histograms, rendered in Prometheus text format at /metrics ---
+METRIC_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+class Metric:
+    """A counter or histogram keyed by label values. Series are plain float lists so a whole
+    process snapshot is JSON; a histogram row is per-bucket counts, the +Inf count, then the sum."""
+
+    instances: Dict[str, "Metric"] = {}
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...], kind: str = "histogram",
+                 buckets: Tuple[float, ...] = METRIC_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.kind = kind
+        self.buckets = tuple(buckets) if kind == "histogram" else ()
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+        Metric.instances[name] = self
+
+    def _row(self, key: Tuple[str, ...]) -> List[float]:
+        row = self._series.get(key)
+        if row is None:
+            row = self._series[key] = [0.0] * (len(self.buckets) + 2 if self.kind == "histogram" else 1)
+        return row
+
+    def inc(self, *labels, value: float = 1.0) -> None:
+        key = tuple(str(v) for v in labels)
+        with self._lock:
+            self._row(key)[0] += value
+
+    def observe(self, seconds: float, *labels) -> None:
+        key = tuple(str(v) for v in labels)
+        i = bisect.bisect_left(self.buckets, seconds)  # first bucket with seconds <= le; len(buckets) is +Inf
+        with self._lock:
+            row = self._row(key)
+            row[i] += 1
+            row[-1] += seconds
+
+    def snapshot(self) -> List[List[Any]]:
+        with self._lock:
+            return [[list(k), list(v)] for k, v in self._series.items()]
+
+    def render(self, series: Dict[Tuple[str, ...], List[float]]) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, row in sorted(series.items()):
+            pairs = [f'{n}="{_prom_escape(v)}"' for n, v in zip(self.labels, key)]
+            labels = ",".join(pairs)
+            if self.kind == "counter":
+                lines.append(f"{self.name}{{{labels}}} {_prom_num(row[0])}")
+                continue
+            total = 0.0
+            for bound, count in zip(self.buckets + (math.inf,), row):
+                total += count
+                le = "+Inf" if bound == math.inf else f"{bound:g}"
+                bucket_labels = ",".join(pairs + [f'le="{le}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {_prom_num(total)}")
+            lines.append(f"{self.name}_sum{{{labels}}} {row[-1]:.6f}")
+            lines.append(f"{self.name}_count{{{labels}}} {_prom_num(total)}")
+        return lines
+
+def _prom_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _prom_num(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+_route_latency = Metric("hs_http_request_duration_seconds", "Flask request latency by route template",
+                        ("route", "method", "status"))
+_rtdb_latency = Metric("hs_rtdb_op_duration_seconds", "Realtime DB round trips by operation and top-level path",
+                       ("op", "prefix", "outcome"))
+_storage_upload_latency = Metric("hs_storage_upload_duration_seconds", "Storage upload + make_public time",
+                                 ("content_type",))
+_storage_upload_bytes = Metric("hs_storage_upload_bytes_total", "Bytes uploaded to Storage", ("content_type",),
+                               kind="counter")
+_outbound_http_latency = Metric("hs_outbound_http_duration_seconds", "Outbound HTTP attempts (Internet Archive)",
+                                ("endpoint", "status"))
+_gemini_latency = Metric("hs_gemini_call_duration_seconds", "Gemini generate_content calls", ("model", "outcome"))
+_cache_lookups = Metric("hs_cache_lookups_total", "TTLCache lookups by result: hit (L1), shared_hit (L2) or miss",
+                        ("cache", "result"), kind="counter")
+
+def metrics_snapshot() -> Dict[str, List[List[Any]]]:
+    return {name: m.snapshot() for name, m in Metric.instances.items()}
+
+def render_metrics() -> str:
+    """This process's live series, summed with the snapshots other workers flushed to the shared cache."""
+    snapshots = [metrics_snapshot()]
+    if _shared_cache is not None and METRICS_FLUSH_INTERVAL > 0:
+        me = str(os.getpid())
+        snapshots += [snap for pid, snap in _shared_cache.items("metrics") if pid != me]
+    merged: Dict[str, Dict[Tuple[str, ...], List[float]]] = {name: {} for name in Metric.instances}
+    for snap in snapshots:
+        for name, series in snap.items():
+            if name not in merged:
+                continue
+            for labels, row in series:
+                key = tuple(labels)
+                cur = merged[name].get(key)
+                merged[name][key] = list(row) if cur is None else [a + b for a, b in zip(cur, row)]
+    lines = ["# HELP hs_metrics_processes Worker processes summed into this scrape",
+             "# TYPE hs_metrics_processes gauge",
+             f"hs_metrics_processes {len(snapshots)}"]
+    for name, m in Metric.instances.items():
+        lines += m.render(merged[name])
+    return "\n".join(lines) + "\n"
+
+def _metrics_flush_loop(interval: int) -> None:
+    while True:
+        time.sleep(interval)
+        _shared_cache.put("metrics", str(os.getpid()), metrics_snapshot(), max(30, interval * 6))
+
+def start_metrics_flusher(interval: int = METRICS_FLUSH_INTERVAL) -> Optional[threading.Thread]:
+    """Multi-worker only: publish this process's series so whichever worker serves /metrics can sum them."""
+    if interval <= 0 or _shared_cache is None:
+        return None
+    t = threading.Thread(target=_metrics_flush_loop, args=(interval,), name="metrics-flush", daemon=True)
+    t.start()
+    return t
+
+# --- Tracing: request-scoped span trees kept in a context variable ---
+class Trace:
+    """Flat span list (id/parent) so pool threads can append concurrently; span 0 is the trace itself."""
+
+    def __init__(self, name: str, kind: str, attrs: Dict[str, Any]):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.kind = kind
+        self.attrs = dict(attrs)
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.t0 = time.perf_counter()
+        self.ids = itertools.count(1)
+        self.spans: List[Dict[str, Any]] = []
+        self.dropped = 0
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def add(self, span_id: int, parent: int, name: str, t0: float, t1: float,
+            attrs: Dict[str, Any], error: Optional[str]) -> None:
+        record = {"id": span_id, "parent": parent, "name": name,
+                  "start_ms": round((t0 - self.t0) * 1000, 2), "dur_ms": round((t1 - t0) * 1000, 2),
+                  "thread": threading.current_thread().name}
+        if attrs:
+            record["attrs"] = attrs
+        if error:
+            record["error"] = error
+        with self._lock:
+            if len(self.spans) < TRACE_MAX_SPANS:
+                self.spans.append(record)
+            else:
+                self.dropped += 1
+
+    def finish(self) -> Dict[str, Any]:
+        dur_ms = (time.perf_counter() - self.t0) * 1000
+        with self._lock:
+            spans = sorted(self.spans, key=lambda r: r["start_ms"])
+        doc = {"trace_id": self.id, "name": self.name, "kind": self.kind, "worker": WORKER_ID,
+               "started_at": self.started_at, "dur_ms": round(dur_ms, 2), "attrs": self.attrs,
+               "error": self.error, "spans": spans, "dropped_spans": self.dropped}
+        if dur_ms >= TRACE_SLOW_MS:
+            _export_trace(doc)
+        return doc
+
+# (trace, id of the innermost open span) for the running request/job; None = not traced (the fast path).
+_trace_span: "contextvars.ContextVar[Optional[Tuple[Trace, int]]]" = contextvars.ContextVar("trace_span", default=None)
+_recent_traces: "deque[Dict[str, Any]]" = deque(maxlen=50)
+_trace_log = logging.getLogger("hidden_stroke.traces")
+_trace_log.propagate = False
+_trace_file_lock = threading.Lock()
+_trace_file_per_process = False  # set in pre-forked workers: RotatingFileHandler is not multi-process safe
+
+def _export_trace(doc: Dict[str, Any]) -> None:
+    _recent_traces.append(doc)
+    log.info(f"Slow trace {doc['trace_id']}: {doc['name']} {doc['dur_ms']:.0f}ms, {len(doc['spans'])} spans")
+    if not TRACE_FILE:
+        return
+    with _trace_file_lock:
+        if not _trace_log.handlers:
+            path = TRACE_FILE
+            if _trace_file_per_process:
+                root, ext = os.path.splitext(path)
+                path = f"{root}.{os.getpid()}{ext}"
+            handler = RotatingFileHandler(path, maxBytes=TRACE_FILE_MAX_BYTES, backupCount=TRACE_FILE_BACKUPS)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            _trace_log.addHandler(handler)
+            _trace_log.setLevel(logging.INFO)
+    _trace_log.info(json.dumps(doc, default=str))
+
+def start_trace(name: str, kind: str, **attrs) -> Tuple[Trace, contextvars.Token]:
+    trace = Trace(name, kind, attrs)
+    return trace, _trace_span.set((trace, 0))
+
+def end_trace(trace: Trace, token: contextvars.Token) -> Dict[str, Any]:
+    _trace_span.reset(token)
+    return trace.finish()
+
+@contextlib.contextmanager
+def span(name: str, **attrs):
+    """Child span of whatever is open in this context; does nothing (and yields None) when not tracing."""
+    cur = _trace_span.get()
+    if cur is None:
+        yield None
+        return
+    trace, parent = cur
+    span_id = next(trace.ids)
+    token = _trace_span.set((trace, span_id))
+    t0 = time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except BaseException as e:
+        error = f"{e.__class__.__name__}: {e}"[:300]
+        raise
+    finally:
+        _trace_span.reset(token)
+        trace.add(span_id, parent, name, t0, time.perf_counter(), attrs, error)
+
+@contextlib.contextmanager
+def trace_root(name: str, **attrs):
+    """A span under the current trace or, when nothing is tracing, a new always-recorded background trace
+    (case builds are rare and slow enough that sampling them out would hide exactly what we want to see)."""
+    if _trace_span.get() is not None:
+        with span(name, **attrs) as a:
+            yield a
+        return
+    trace, token = start_trace(name, "background", **attrs)
+    try:
+        yield trace.attrs
+    except BaseException as e:
+        trace.error = f"{e.__class__.__name__}: {e}"[:300]
+        raise
+    finally:
+        end_trace(trace, token)
+
+def in_trace_context(fn):
+    """Bind fn to the caller's context so spans opened in a pool thread nest under the caller.
+    Each call runs in its own copy: a Context can only be entered by one thread at a time (ex.map)."""
+    if _trace_span.get() is None:
+        return fn
+    ctx = contextvars.copy_context()
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        return ctx.copy().run(fn, *args, **kwargs)
+    return run
+
+def recent_traces(limit: int = 20) -> List[Dict[str, Any]]:
+    return list(_recent_traces)[-limit:][::-1]
+
+# --- In-process TTL/LRU cache (case docs are immutable once generated) ---
+class TTLCache:
+    """Bounded, thread-safe LRU cache whose entries also expire after `ttl` seconds.
+    With shared=True it is the L1 in front of the host-wide SharedCache: local entries live at most
+    SHARED_CACHE_L1_TTL, so an invalidation in one worker reaches the others within that bound."""
+
+    instances: List["TTLCache"] = []
+
+    def __init__(self, name: str, max_items: int, ttl: float, shared: bool = False):
+        self.name = name
+        self.max_items = max(1, max_items)
+        self.ttl = ttl
+        self.shared = shared and _shared_cache is not None
+        self.local_ttl = min(ttl, SHARED_CACHE_L1_TTL) if self.shared else ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        TTLCache.instances.append(self)
+
+    def get(self, key: str) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] >= now:
+                self._data.move_to_end(key)
+                self.hits += 1
+                _cache_lookups.inc(self.name, "hit")
+                return item[1]
+            if item is not None:
+                del self._data[key]
+        value = _shared_cache.get(self.name, key) if self.shared else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.shared_hits += 1
+                self._put_local(key, value)
+        _cache_lookups.inc(self.name, "miss" if value is None else "shared_hit")
+        return value
+
+    def _put_local(self, key: str, value: Any) -> None:
+        self._data[key] = (time.monotonic() + self.local_ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_items:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._put_local(key, value)
+        if self.shared:
+            _shared_cache.put(self.name, key, value, self.ttl)
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+        if self.shared:
+            _shared_cache.delete(self.name, key)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "max_items": self.max_items,
+                "ttl": self.ttl,
+                "shared": self.shared,
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round((self.hits + self.shared_hits) / lookups, 4) if lookups else None,
+            }
+
+_case_public_cache = TTLCache("case_public", CASE_CACHE_MAX, CASE_CACHE_TTL, shared=True)
+_case_solution_cache = TTLCache("case_solution", CASE_CACHE_MAX, CASE_CACHE_TTL, shared=True)
+
+def get_case_public(case_id: str) -> Dict[str, Any]:
+    public = _case_public_cache.get(case_id)
+    if public is None:
+        public = case_ref(case_id).child("public").get() or {}
+        if public:
+            # RTDB drops empty arrays; the client joins ownership_chain unconditionally.
+            public["metadata"] = [dict(b, ownership_chain=b.get("ownership_chain") or [])
+                                  for b in (public.get("metadata") or []) if b]
+            _case_public_cache.put(case_id, public)
+    return public
+
+def get_case_solution(case_id: str) -> Dict[str, Any]:
+    solution = _case_solution_cache.get(case_id)
+    if solution is None:
+        solution = case_ref(case_id).child("solution").get() or {}
+        if solution:
+            _case_solution_cache.put(case_id, solution)
+    return solution
+
+_case_tiles_cache = TTLCache("case_tiles", CASE_CACHE_MAX, CASE_CACHE_TTL, shared=True)
+
+def get_case_tiles(case_id: str) -> List[Dict[str, Any]]:
+    tiles = _case_tiles_cache.get(case_id)
+    if tiles is None:
+        tiles = case_ref(case_id).child("tiles").get() or []
+        if tiles:
+            _case_tiles_cache.put(case_id, tiles)
+    return tiles
+
+def invalidate_case_cache(case_id: str) -> None:
+    _case_public_cache.invalidate(case_id)
+    _case_solution_cache.invalidate(case_id)
+    _case_tiles_cache.invalidate(case_id)
+    log.info(f"Case cache invalidated for {case_id}")
+
 def hmac_hex(s: str) -> str:
     return hmac.new(GAME_SALT.encode(), s.encode(), hashlib.sha256).hexdigest()
 
@@ -141,10 +787,14 @@ def fb_key(raw: str) -> str:
 
 def upload_bytes_to_storage(data: bytes, path: str, content_type: str) -> str:
     log.debug(f"Uploading to Storage: path={path}, content_type={content_type}, bytes={len(data)}")
-    blob = bucket.blob(path)
-    blob.upload_from_string(data, content_type=content_type)
-    blob.make_public()
-    url = blob.public_url
+    t0 = time.perf_counter()
+    with span("storage_upload", path=path, bytes=len(data)):
+        blob = bucket.blob(path)
+        blob.upload_from_string(data, content_type=content_type)
+        blob.make_public()
+        url = blob.public_url
+    _storage_upload_latency.observe(time.perf_counter() - t0, content_type)
+    _storage_upload_bytes.inc(content_type, value=len(data))
     log.debug(f"Uploaded: {url}")
     return url
 
@@ -152,10 +802,172 @@ def pil_from_inline_image_part(part) -> Image.Image:
     image_bytes = part.inline_data.data
     return Image.open(io.BytesIO(image_bytes)).convert("RGB")
 
-def save_image_return_url(img: Image.Image, path: str, quality=92) -> str:
+# --- Content-addressed blobs: identical bytes are stored (and uploaded) once ---
+_blob_url_cache = TTLCache("blob_urls", 4096, 86400)
+_blob_stats = {"uploads": 0, "dedup_hits": 0, "bytes_uploaded": 0, "bytes_saved": 0}
+_blob_stats_lock = threading.Lock()
+
+def blob_path_for(digest: str, ext: str) -> str:
+    return f"blobs/sha256/{digest[:2]}/{digest}.{ext}"
+
+def upload_blob_dedup(data: bytes, content_type: str, ext: str) -> str:
+    """Upload under a sha256-derived path unless that blob already exists; returns its public URL."""
+    digest = hashlib.sha256(data).hexdigest()
+    url = _blob_url_cache.get(digest)
+    if url is None:
+        path = blob_path_for(digest, ext)
+        blob = bucket.blob(path)
+        if blob.exists():
+            url = blob.public_url
+            log.debug(f"Blob {digest[:12]} already stored at {path}")
+        else:
+            url = upload_bytes_to_storage(data, path, content_type)
+            with _blob_stats_lock:
+                _blob_stats["uploads"] += 1
+                _blob_stats["bytes_uploaded"] += len(data)
+            _blob_url_cache.put(digest, url)
+            return url
+        _blob_url_cache.put(digest, url)
+    with _blob_stats_lock:
+        _blob_stats["dedup_hits"] += 1
+        _blob_stats["bytes_saved"] += len(data)
+    return url
+
+def blob_stats() -> Dict[str, int]:
+    with _blob_stats_lock:
+        return dict(_blob_stats)
+
+# --- Derivatives: thumbnail / display / zoom renditions of a case image ---
+def encode_derivatives(img: Image.Image) -> Dict[str, Dict[str, Any]]:
+    """CPU-only: encode every IMAGE_DERIVATIVES size, largest first so each resize starts from the previous one."""
+    src = img if img.mode == "RGB" else img.convert("RGB")
+    out: Dict[str, Dict[str, Any]] = {}
+    for name, dim in sorted(IMAGE_DERIVATIVES, key=lambda nd: -nd[1]):
+        t0 = time.monotonic()
+        src = _resize_if_needed(src, max_dim=dim)
+        t1 = time.monotonic()
+        jpeg = io.BytesIO()
+        src.save(jpeg, format="JPEG", quality=DERIVATIVE_JPEG_QUALITY, optimize=True, progressive=True)
+        t2 = time.monotonic()
+        entry = {
+            "width": src.size[0],
+            "height": src.size[1],
+            "jpeg": jpeg.getvalue(),
+            "timings": {"resize_ms": round((t1 - t0) * 1000, 1), "jpeg_ms": round((t2 - t1) * 1000, 1)},
+        }
+        if WEBP_SUPPORTED:
+            webp = io.BytesIO()
+            src.save(webp, format="WEBP", quality=DERIVATIVE_WEBP_QUALITY, method=4)
+            entry["webp"] = webp.getvalue()
+            entry["timings"]["webp_ms"] = round((time.monotonic() - t2) * 1000, 1)
+        out[name] = entry
+    return out
+
+def upload_derivatives(encoded: Dict[str, Dict[str, Any]]) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, float]]]:
+    """Upload encoded derivatives; returns (manifest for the public doc, per-derivative timings/sizes)."""
+    manifest: Dict[str, Dict[str, Any]] = {}
+    timings: Dict[str, Dict[str, float]] = {}
+    for name, entry in encoded.items():
+        t0 = time.monotonic()
+        item = {"width": entry["width"], "height": entry["height"],
+                "jpeg": upload_blob_dedup(entry["jpeg"], "image/jpeg", "jpg")}
+        stats = dict(entry["timings"], jpeg_bytes=len(entry["jpeg"]))
+        if "webp" in entry:
+            item["webp"] = upload_blob_dedup(entry["webp"], "image/webp", "webp")
+            stats["webp_bytes"] = len(entry["webp"])
+        stats["upload_ms"] = round((time.monotonic() - t0) * 1000, 1)
+        manifest[name] = item
+        timings[name] = stats
+    return manifest, timings
+
+def build_derivatives(img: Image.Image, label: str = "") -> Dict[str, Any]:
+    manifest, timings = upload_derivatives(encode_derivatives(img))
+    log.debug(f"Derivatives {label}: {timings}")
+    return {"derivatives": manifest, "derivative_timings": timings}
+
+# --- Deep-zoom tile pyramids (DZI layout: level L is the image at ceil(dim / 2**(max_level - L))) ---
+def tile_manifests_ref():
+    return db_root.child("tile_manifests")
+
+def _halve(arr: np.ndarray) -> np.ndarray:
+    """2x2 box downsample of an HxWx3 uint8 array; odd edges are replicated (DZI ceil sizing)."""
+    h, w = arr.shape[:2]
+    if h % 2 or w % 2:
+        arr = np.pad(arr, ((0, h % 2), (0, w % 2), (0, 0)), mode="edge")
+    quads = arr.reshape(arr.shape[0] // 2, 2, arr.shape[1] // 2, 2, 3).astype(np.uint16)
+    return ((quads.sum(axis=(1, 3)) + 2) >> 2).astype(np.uint8)
+
+def _tile_grid(arr: np.ndarray, size: int) -> np.ndarray:
+    """(rows, cols, size, size, 3) view over the edge-padded level; one reshape instead of per-tile slicing."""
+    h, w = arr.shape[:2]
+    rows, cols = -(-h // size), -(-w // size)
+    padded = np.pad(arr, ((0, rows * size - h), (0, cols * size - w), (0, 0)), mode="edge")
+    return padded.reshape(rows, size, cols, size, 3).swapaxes(1, 2)
+
+def encode_tile_pyramid(img: Image.Image) -> Tuple[Dict[str, Any], Dict[str, bytes]]:
+    """Returns (layout, {"{level}/{col}_{row}.jpg": jpeg}) from the full level down to the first single-tile level."""
+    img = _resize_if_needed(img if img.mode == "RGB" else img.convert("RGB"), max_dim=TILE_MAX_DIM)
+    arr = np.asarray(img)
+    h, w = arr.shape[:2]
+    level = max_level = max(0, math.ceil(math.log2(max(w, h))))
+    levels: List[Dict[str, int]] = []
+    tiles: Dict[str, bytes] = {}
+    while True:
+        lh, lw = arr.shape[:2]
+        grid = _tile_grid(arr, TILE_SIZE)
+        rows, cols = grid.shape[:2]
+        for r in range(rows):
+            th = min(TILE_SIZE, lh - r * TILE_SIZE)
+            for c in range(cols):
+                tw = min(TILE_SIZE, lw - c * TILE_SIZE)
+                buf = io.BytesIO()
+                Image.fromarray(np.ascontiguousarray(grid[r, c, :th, :tw])).save(buf, format="JPEG", quality=TILE_JPEG_QUALITY)
+                tiles[f"{level}/{c}_{r}.jpg"] = buf.getvalue()
+        levels.append({"level": level, "width": lw, "height": lh, "cols": cols, "rows": rows})
+        if max(lw, lh) <= TILE_SIZE or level == 0:
+            break  # lower levels would be one ever-smaller tile; clients scale this one instead
+        arr = _halve(arr)
+        level -= 1
+    layout = {
+        "format": "jpg",
+        "tile_size": TILE_SIZE,
+        "overlap": 0,
+        "width": w,
+        "height": h,
+        "min_level": level,
+        "max_level": max_level,
+        "levels": levels[::-1],
+    }
+    return layout, tiles
+
+def ensure_tile_pyramid(image_url: str, img: Optional[Image.Image] = None) -> Dict[str, Any]:
+    """Tile manifest for an image URL, building and uploading the pyramid once per (content-addressed) URL."""
+    key = hashlib.sha256(image_url.encode()).hexdigest()[:32]
+    manifest = tile_manifests_ref().child(key).get()
+    if manifest:
+        return manifest
+    if img is None:
+        img = download_image_to_pil(image_url, max_dim=TILE_MAX_DIM)
+
+    t0 = time.monotonic()
+    layout, tiles = encode_tile_pyramid(img)
+    t1 = time.monotonic()
+    base = f"tiles/{key}"
+    names = list(tiles)
+    with ThreadPoolExecutor(max_workers=TILE_UPLOAD_WORKERS, thread_name_prefix="tile-upload") as ex:
+        urls = list(ex.map(in_trace_context(lambda n: upload_bytes_to_storage(tiles[n], f"{base}/{n}", "image/jpeg")), names))
+    t2 = time.monotonic()
+
+    manifest = dict(layout, url_template=urls[0][:-len(names[0])] + "{level}/{col}_{row}.jpg", tiles=len(names))
+    tile_manifests_ref().child(key).set(manifest)
+    log.info(f"Tile pyramid {base}: {len(names)} tiles, levels {layout['min_level']}-{layout['max_level']}, "
+             f"encode={t1 - t0:.2f}s upload={t2 - t1:.2f}s bytes={sum(map(len, tiles.values()))}")
+    return manifest
+
+def save_image_return_url(img: Image.Image, quality=92) -> str:
     b = io.BytesIO()
     img.save(b, format="JPEG", quality=quality, optimize=True)
-    return upload_bytes_to_storage(b.getvalue(), path, "image/jpeg")
+    return upload_blob_dedup(b.getvalue(), "image/jpeg", "jpg")
 
 def extract_user_from_headers(req) -> Tuple[str, str]:
     uname = (req.headers.get("X-Reddit-User") or "").strip()
@@ -172,25 +984,328 @@ def seed_for_date(case_id: str) -> int:
 def fifty_fifty_mode(case_seed: int) -> str:
     return "knowledge" if (case_seed % 2 == 0) else "observation"
 
+_host_slots: Dict[str, threading.BoundedSemaphore] = {}
+_host_slots_guard = threading.Lock()
+
+def _host_slot(url: str) -> threading.BoundedSemaphore:
+    """Per-host concurrency cap shared by every outbound HTTP caller in this process."""
+    host = urlparse(url).netloc
+    with _host_slots_guard:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(IA_PER_HOST_CONCURRENCY)
+        return _host_slots[host]
+
+# --- Shared pooled HTTP client (keep-alive, retries with jittered backoff) ---
+_http = requests.Session()
+_http.headers.update({"User-Agent": IA_USER_AGENT})
+_http_adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+_http.mount("https://", _http_adapter)
+_http.mount("http://", _http_adapter)
+
+_http_stats: Dict[str, Dict[str, float]] = {}
+_http_stats_lock = threading.Lock()
+
+def _endpoint_key(url: str) -> str:
+    p = urlparse(url)
+    return f"{p.netloc}/{p.path.strip('/').split('/')[0]}"
+
+def _record_http(url: str, elapsed_ms: float, status: Optional[int], retried: bool) -> None:
+    key = _endpoint_key(url)
+    # IA serves files from numbered hosts (ia8012.us.archive.org/12/...): fold the digits to bound the labels.
+    _outbound_http_latency.observe(elapsed_ms / 1000, re.sub(r"\d+", "N", key), status or "error")
+    with _http_stats_lock:
+        st = _http_stats.setdefault(key, {"requests": 0, "errors": 0, "retries": 0, "total_ms": 0.0, "max_ms": 0.0})
+        st["requests"] += 1
+        st["total_ms"] += elapsed_ms
+        st["max_ms"] = max(st["max_ms"], elapsed_ms)
+        if status is None or status >= 400:
+            st["errors"] += 1
+        if retried:
+            st["retries"] += 1
+
+def http_stats() -> Dict[str, Any]:
+    with _http_stats_lock:
+        return {k: dict(v, avg_ms=round(v["total_ms"] / v["requests"], 1) if v["requests"] else None)
+                for k, v in _http_stats.items()}
+
+def _retry_after_seconds(resp: requests.Response) -> Optional[float]:
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+        except Exception:
+            return None
+
+def _backoff_delay(attempt: int) -> float:
+    # "Full jitter": uniform over [0, base * 2^attempt], capped.
+    return random.uniform(0, min(HTTP_BACKOFF_MAX, HTTP_BACKOFF_BASE * (2 ** attempt)))
+
+def http_request(url: str, params: dict = None, timeout: float = 30, stream: bool = False, headers: dict = None) -> requests.Response:
+    """GET through the pooled session, retrying connection errors, 429 and 5xx."""
+    for attempt in range(HTTP_MAX_RETRIES + 1):
+        last = attempt == HTTP_MAX_RETRIES
+        t0 = time.monotonic()
+        try:
+            with span("http_request", url=url, attempt=attempt) as attrs, _host_slot(url):
+                r = _http.get(url, params=params, timeout=timeout, stream=stream, headers=headers)
+                if attrs is not None:
+                    attrs["status"] = r.status_code
+        except (requests.ConnectionError, requests.Timeout) as e:
+            _record_http(url, (time.monotonic() - t0) * 1000, None, attempt > 0)
+            if last:
+                raise
+            delay = _backoff_delay(attempt)
+            log.warning(f"HTTP GET {url} failed ({e.__class__.__name__}); retry {attempt + 1} in {delay:.2f}s")
+            time.sleep(delay)
+            continue
+        _record_http(url, (time.monotonic() - t0) * 1000, r.status_code, attempt > 0)
+        if r.status_code in HTTP_RETRY_STATUSES and not last:
+            retry_after = _retry_after_seconds(r)
+            delay = min(HTTP_BACKOFF_MAX, retry_after) if retry_after is not None else _backoff_delay(attempt)
+            log.warning(f"HTTP {r.status_code} for {r.url}; retry {attempt + 1} in {delay:.2f}s")
+            r.close()
+            time.sleep(delay)
+            continue
+        return r
+    raise RuntimeError("unreachable")
+
+class ImageTooLargeError(ValueError):
+    """Source image exceeds IMAGE_MAX_BYTES or IMAGE_MAX_PIXELS."""
+
+# --- On-disk HTTP cache: URL-keyed bodies with validators, LRU-evicted under a byte cap ---
+class DiskCache:
+    """Files live at {root}/{key[:2]}/{key}.body + .meta; recency is the body mtime, so it survives restarts.
+
+    All gunicorn workers share the directory, so usage is measured from the directory itself (under an
+    flock on {root}/.lock) instead of being tracked per process. A process re-scans and evicts after it
+    has written max_bytes / EVICT_SLACK since its last scan."""
+
+    EVICT_SLACK = 64
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._unscanned = 0  # bytes this process stored since its last eviction scan
+        self.counters = {"hits": 0, "revalidated": 0, "misses": 0, "stores": 0, "evictions": 0}
+        os.makedirs(root, exist_ok=True)
+        entries, nbytes = self._evict()
+        log.info(f"HTTP disk cache at {root}: {entries} entries, {nbytes / 1e6:.1f} MB")
+
+    @staticmethod
+    def key_for(url: str) -> str:
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def _path(self, key: str, ext: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.{ext}")
+
+    def _scan(self) -> List[Tuple[float, str, int]]:
+        """(mtime, key, size) of every body currently in the directory, whichever process wrote it."""
+        entries = []
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if name.endswith(".body"):
+                    try:
+                        st = os.stat(os.path.join(dirpath, name))
+                    except FileNotFoundError:  # evicted by another worker meanwhile
+                        continue
+                    entries.append((st.st_mtime, name[:-5], st.st_size))
+        return entries
+
+    @contextlib.contextmanager
+    def _dir_lock(self):
+        """Exclusive across every process (and thread) using the directory; closing the file releases it."""
+        try:
+            import fcntl
+        except ImportError:  # no flock (Windows dev server): single process anyway
+            fcntl = None
+        with open(os.path.join(self.root, ".lock"), "a") as f:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            yield
+
+    def _write_atomic(self, path: str, write) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp-{uuid.uuid4().hex[:8]}"
+        try:
+            with open(tmp, "wb") as f:
+                write(f)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+
+    def meta(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(key, "meta")) as f:
+                meta = json.load(f)
+            if os.path.getsize(self._path(key, "body")) != meta.get("size"):
+                return None
+            return meta
+        except (OSError, ValueError):
+            return None
+
+    def open(self, key: str):
+        """Readable, seekable file object over the body: mmap for large entries, BytesIO otherwise."""
+        path = self._path(key, "body")
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            body = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size >= max(1, HTTP_DISK_CACHE_MMAP_BYTES) else io.BytesIO(f.read())
+        try:
+            os.utime(path)
+        except FileNotFoundError:  # evicted by another worker after we opened it; our copy stays readable
+            pass
+        return body
+
+    def store(self, key: str, meta: Dict[str, Any], chunks, max_bytes: int) -> None:
+        total = 0
+
+        def _write(f):
+            nonlocal total
+            for chunk in chunks:
+                total += len(chunk)
+                if total > max_bytes:
+                    raise ImageTooLargeError(f"{meta['url']}: body exceeds {max_bytes} bytes")
+                f.write(chunk)
+
+        self._write_atomic(self._path(key, "body"), _write)
+        meta = dict(meta, size=total, stored_at=time.time())
+        self._write_atomic(self._path(key, "meta"), lambda f: f.write(json.dumps(meta).encode()))
+        with self._lock:
+            self.counters["stores"] += 1
+            self._unscanned += total
+            due = self._unscanned >= max(1, self.max_bytes // self.EVICT_SLACK)
+            if due:
+                self._unscanned = 0
+        if due:
+            self._evict()
+
+    def refresh(self, key: str, meta: Dict[str, Any]) -> None:
+        meta = dict(meta, stored_at=time.time())
+        self._write_atomic(self._path(key, "meta"), lambda f: f.write(json.dumps(meta).encode()))
+
+    def _evict(self) -> Tuple[int, int]:
+        """Delete the least recently used entries until the directory fits max_bytes; returns (entries, bytes) left."""
+        with self._dir_lock():
+            entries = sorted(self._scan())
+            total = sum(size for _, _, size in entries)
+            evicted = 0
+            while total > self.max_bytes and len(entries) - evicted > 1:
+                _, key, size = entries[evicted]
+                for ext in ("meta", "body"):
+                    try:
+                        os.unlink(self._path(key, ext))  # readers holding an fd/mmap keep their copy
+                    except FileNotFoundError:
+                        pass
+                total -= size
+                evicted += 1
+        if evicted:
+            with self._lock:
+                self.counters["evictions"] += evicted
+            log.debug(f"HTTP disk cache: evicted {evicted} entries, {total / 1e6:.1f} MB left")
+        return len(entries) - evicted, total
+
+    def count(self, counter: str) -> None:
+        with self._lock:
+            self.counters[counter] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters are this process's; entries and bytes are the shared directory's."""
+        entries = self._scan()
+        with self._lock:
+            counters = dict(self.counters)
+        return dict(counters, entries=len(entries), bytes=sum(size for _, _, size in entries),
+                    max_bytes=self.max_bytes, root=self.root)
+
+_disk_cache: Optional[DiskCache] = None
+if HTTP_DISK_CACHE_DIR:
+    try:
+        _disk_cache = DiskCache(HTTP_DISK_CACHE_DIR, HTTP_DISK_CACHE_MAX_BYTES)
+    except OSError:
+        log.exception(f"HTTP disk cache disabled: cannot use {HTTP_DISK_CACHE_DIR}")
+
+def _read_body(r: requests.Response, url: str, max_bytes: int):
+    """Spool a streamed response body into a temp file, aborting as soon as it passes `max_bytes`."""
+    declared = int(r.headers.get("Content-Length") or 0)
+    if declared > max_bytes:
+        raise ImageTooLargeError(f"{url}: Content-Length {declared} > {max_bytes}")
+    buf = tempfile.SpooledTemporaryFile(max_size=IMAGE_SPOOL_BYTES)
+    total = 0
+    for chunk in r.iter_content(chunk_size=64 * 1024):
+        total += len(chunk)
+        if total > max_bytes:
+            buf.close()
+            raise ImageTooLargeError(f"{url}: body exceeds {max_bytes} bytes")
+        buf.write(chunk)
+    buf.seek(0)
+    log.debug(f"HTTP {r.status_code} for {r.url} streamed bytes={total}")
+    return buf
+
+def http_get_cached(url: str, params: dict = None, timeout: float = 60, max_bytes: int = IMAGE_MAX_BYTES):
+    """GET body as a readable file object, read through the disk cache (fresh hit, 304 revalidation or refetch)."""
+    if _disk_cache is None:
+        r = http_request(url, params=params, timeout=timeout, stream=True)
+        try:
+            r.raise_for_status()
+            return _read_body(r, url, max_bytes)
+        finally:
+            r.close()
+
+    full_url = requests.Request("GET", url, params=params).prepare().url
+    key = DiskCache.key_for(full_url)
+    meta = _disk_cache.meta(key)
+    if meta and time.time() - meta["stored_at"] < HTTP_DISK_CACHE_FRESH:
+        _disk_cache.count("hits")
+        log.debug(f"HTTP disk cache hit: {full_url}")
+        return _disk_cache.open(key)
+
+    headers = {}
+    if meta and meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta and meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+    r = http_request(full_url, timeout=timeout, stream=True, headers=headers)
+    try:
+        if r.status_code == 304 and meta:
+            _disk_cache.count("revalidated")
+            _disk_cache.refresh(key, meta)
+            log.debug(f"HTTP 304 for {full_url}; serving disk copy")
+            return _disk_cache.open(key)
+        r.raise_for_status()
+        if "no-store" in (r.headers.get("Cache-Control") or "").lower():
+            return _read_body(r, full_url, max_bytes)
+        declared = int(r.headers.get("Content-Length") or 0)
+        if declared > max_bytes:
+            raise ImageTooLargeError(f"{full_url}: Content-Length {declared} > {max_bytes}")
+        _disk_cache.count("misses")
+        _disk_cache.store(key, {
+            "url": full_url,
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "content_type": r.headers.get("Content-Type"),
+        }, r.iter_content(chunk_size=64 * 1024), max_bytes)
+    finally:
+        r.close()
+    log.debug(f"HTTP {r.status_code} for {full_url} stored in disk cache")
+    return _disk_cache.open(key)
+
 def http_get_json(url: str, params: dict = None) -> dict:
     log.debug(f"HTTP GET JSON: {url} params={params}")
-    headers = {"User-Agent": IA_USER_AGENT}
-    r = requests.get(url, params=params, headers=headers, timeout=30)
-    log.debug(f"HTTP {r.status_code} for {r.url}")
-    r.raise_for_status()
-    return r.json()
+    with span("http_get_json", url=url), http_get_cached(url, params=params, timeout=30) as fp:
+        return json.loads(fp.read())
 
 def http_get_bytes(url: str) -> bytes:
     log.debug(f"HTTP GET BYTES: {url}")
-    headers = {"User-Agent": IA_USER_AGENT}
-    r = requests.get(url, headers=headers, timeout=60)
-    log.debug(f"HTTP {r.status_code} for {r.url} bytes={len(r.content)}")
-    r.raise_for_status()
-    return r.content
+    with span("http_get_bytes", url=url), http_get_cached(url) as fp:
+        return fp.read()
 
 def ia_advanced_search(query: str, rows: int, page: int) -> List[dict]:
     url = "https://archive.org/advancedsearch.php"
-    params = {"q": query, "rows": rows, "page": page, "output": "json"}
+    params = {"q": query, "rows": rows, "page": page, "output": "json", "fl[]": IA_SEARCH_FIELDS}
     try:
         data = http_get_json(url, params=params)
         docs = data.get("response", {}).get("docs", [])
@@ -200,11 +1315,17 @@ def ia_advanced_search(query: str, rows: int, page: int) -> List[dict]:
         log.exception("IA advanced search failed")
         raise
 
+_ia_metadata_cache = TTLCache("ia_metadata", 512, IA_METADATA_CACHE_TTL)
+
 def ia_metadata(identifier: str) -> dict:
+    meta = _ia_metadata_cache.get(identifier)
+    if meta is not None:
+        return meta
     url = f"https://archive.org/metadata/{identifier}"
     try:
         meta = http_get_json(url)
         log.debug(f"Fetched metadata for {identifier}, files={len(meta.get('files', []) or [])}")
+        _ia_metadata_cache.put(identifier, meta)
         return meta
     except Exception:
         log.exception(f"IA metadata fetch failed for {identifier}")
@@ -215,7 +1336,7 @@ def ia_best_image_from_metadata(meta: dict) -> Optional[dict]:
     best, best_pixels = None, -1
     for f in files:
         fmt = (f.get("format") or "").lower()
-        if any(x in fmt for x in ["jpeg", "jpg", "png", "tiff", "image"]):
+        if any(x in fmt for x in IA_IMAGE_FORMATS):
             w = int(f.get("width") or 0)
             h = int(f.get("height") or 0)
             px = w * h if (w and h) else int(f.get("size") or 0)
@@ -227,14 +1348,47 @@ def ia_best_image_from_metadata(meta: dict) -> Optional[dict]:
         log.warning("No suitable image file found in metadata")
     return best
 
-def ingest_ia_doc(doc: dict) -> Optional[dict]:
-    """Fetch /metadata and store best image entry into ia_pool (sanitized key)."""
+def _ia_field(v: Any) -> str:
+    # advancedsearch returns repeated fields (creator, title, ...) as lists.
+    if isinstance(v, list):
+        return "; ".join(str(x) for x in v if x)
+    return str(v) if v else ""
+
+def ia_doc_has_image_format(doc: dict) -> bool:
+    formats = doc.get("format")
+    if not formats:
+        return True  # unknown: let lazy resolution decide
+    formats = formats if isinstance(formats, list) else [formats]
+    return any(x in str(f).lower() for f in formats for x in IA_IMAGE_FORMATS)
+
+def record_from_search_doc(doc: dict) -> dict:
+    """An ia_pool record built only from advancedsearch fields; the image file is resolved later."""
+    identifier = doc.get("identifier")
+    return {
+        "identifier": identifier,
+        "_pool_key": fb_key(identifier),
+        "title": _ia_field(doc.get("title")),
+        "date": _ia_field(doc.get("date")),
+        "creator": _ia_field(doc.get("creator")),
+        "rights": _ia_field(doc.get("rights")),
+        "licenseurl": _ia_field(doc.get("licenseurl")),
+        "source": "internet_archive"
+    }
+
+def ia_file_fields(identifier: str, best: dict) -> dict:
+    return {
+        "download_url": f"https://archive.org/download/{identifier}/{best['name']}",
+        "file_name": best["name"],
+        "format": best.get("format"),
+        "width": best.get("width"),
+        "height": best.get("height"),
+        "size": best.get("size"),
+    }
+
+def build_ia_record(doc: dict, meta: dict) -> Optional[dict]:
+    """Turn an advancedsearch doc + its /metadata into an ia_pool record (sanitized key)."""
     identifier = doc.get("identifier")
-    if not identifier:
-        return None
     pool_key = fb_key(identifier)
-    log.info(f"Ingesting IA identifier={identifier} -> pool_key={pool_key}")
-    meta = ia_metadata(identifier)
     best = ia_best_image_from_metadata(meta)
     if not best:
         log.warning(f"Skipping {identifier}: no image file")
@@ -247,41 +1401,171 @@ def ingest_ia_doc(doc: dict) -> Optional[dict]:
     rights = md.get("rights", "") or doc.get("rights", "")
     licenseurl = md.get("licenseurl", "") or doc.get("licenseurl", "")
 
-    download_url = f"https://archive.org/download/{identifier}/{best['name']}"
     record = {
         "identifier": identifier,       # original IA id preserved
         "_pool_key": pool_key,          # sanitized RTDB key
-        "title": title,
-        "date": str(date),
-        "creator": creator,
-        "rights": rights,
-        "licenseurl": licenseurl,
-        "download_url": download_url,
-        "file_name": best["name"],
-        "format": best.get("format"),
-        "width": best.get("width"),
-        "height": best.get("height"),
-        "size": best.get("size"),
+        "title": _ia_field(title),
+        "date": _ia_field(date),
+        "creator": _ia_field(creator),
+        "rights": _ia_field(rights),
+        "licenseurl": _ia_field(licenseurl),
+        **ia_file_fields(identifier, best),
         "source": "internet_archive"
     }
-    ia_pool_ref().child(pool_key).set(record)
-    log.info(f"Ingested {identifier} -> ia_pool/{pool_key} (title='{title}')")
     return record
 
+def resolve_ia_download(rec: dict) -> Optional[dict]:
+    """Fill in download_url/file fields for a lazily ingested record (one cached /metadata call)."""
+    if rec.get("download_url") or rec.get("storage_url"):
+        return rec
+    identifier = rec.get("identifier")
+    pool_key = rec.get("_pool_key") or fb_key(identifier)
+    best = ia_best_image_from_metadata(ia_metadata(identifier))
+    if not best:
+        ia_pool_ref().child(pool_key).update({"no_image": True})
+        invalidate_ia_pool_index()
+        log.warning(f"{identifier}: no image file, flagged in pool")
+        return None
+    fields = ia_file_fields(identifier, best)
+    ia_pool_ref().child(pool_key).update(fields)
+    log.debug(f"Resolved {identifier} -> {fields['file_name']}")
+    return {**rec, **fields}
+
+_ia_pool_index_cache = TTLCache("ia_pool_index", 2, IA_POOL_INDEX_TTL, shared=True)
+
+def ia_pool_usable(rec: dict) -> bool:
+    """A pool item case generation may pick: it has an image and was not flagged as a duplicate or rejected."""
+    return not rec.get("no_image") and not rec.get("duplicate_of") and not rec.get("rejected")
+
+def invalidate_ia_pool_index() -> None:
+    """Drop the cached key list and usable count; call after any write that adds or flags pool items."""
+    _ia_pool_index_cache.invalidate("keys")
+    _ia_pool_index_cache.invalidate("usable")
+
+def ia_pool_keys(cached: bool = False) -> set:
+    """Pool key names via a shallow read; cached=True accepts the host-wide copy (dropped on every ingest)."""
+    if cached:
+        keys = _ia_pool_index_cache.get("keys")
+        if keys is not None:
+            return set(keys)
+    keys = set((ia_pool_ref().get(shallow=True) or {}).keys())
+    _ia_pool_index_cache.put("keys", sorted(keys))
+    return keys
+
+def ia_pool_usable_count(cached: bool = False) -> int:
+    """How many pool items case generation can actually use (full pool read; cached=True accepts the host copy)."""
+    if cached:
+        n = _ia_pool_index_cache.get("usable")
+        if n is not None:
+            return n
+    n = sum(1 for r in (ia_pool_ref().get() or {}).values() if ia_pool_usable(r or {}))
+    _ia_pool_index_cache.put("usable", n)
+    return n
+
+def ingest_ia_docs(docs: List[dict], limit: Optional[int] = None) -> Dict[str, Any]:
+    """Ingest one search page: one pool existence read, parallel /metadata, one batched write."""
+    existing = ia_pool_keys()
+    todo, seen = [], set()
+    for d in docs:
+        ident = d.get("identifier")
+        if not ident or fb_key(ident) in existing or ident in seen:
+            continue
+        seen.add(ident)
+        todo.append(d)
+
+    records: List[dict] = []
+    errors = 0
+    if IA_INGEST_MODE == "fields":
+        records = [record_from_search_doc(d) for d in todo if ia_doc_has_image_format(d)]
+        todo = []
+    with ThreadPoolExecutor(max_workers=IA_INGEST_WORKERS, thread_name_prefix="ia-ingest") as ex:
+        while todo and (limit is None or len(records) < limit):
+            # Fetch only as many as could still be needed (but keep the pool busy).
+            want = len(todo) if limit is None else max(limit - len(records), IA_INGEST_WORKERS)
+            chunk, todo = todo[:want], todo[want:]
+            futs = {ex.submit(in_trace_context(ia_metadata), d["identifier"]): d for d in chunk}
+            for fut, d in futs.items():
+                try:
+                    rec = build_ia_record(d, fut.result())
+                except Exception:
+                    errors += 1
+                    log.exception(f"Ingest failed for {d.get('identifier')}")
+                    continue
+                if rec:
+                    records.append(rec)
+
+    if limit is not None:
+        records = records[:limit]
+    if records:
+        ia_pool_ref().update({rec["_pool_key"]: rec for rec in records})
+        invalidate_ia_pool_index()
+        log.info(f"Ingested {len(records)} IA records in one batched write")
+    return {"records": records, "errors": errors, "skipped_existing": len(docs) - len(seen)}
+
+def is_too_small(width: Any, height: Any, min_width: int = IMAGE_MIN_DIM, min_height: int = IMAGE_MIN_DIM) -> bool:
+    """True only when both dimensions are known (IA metadata or a decode) and one falls short."""
+    try:
+        w, h = int(width or 0), int(height or 0)
+    except (TypeError, ValueError):
+        return False
+    return bool(w and h) and (w < min_width or h < min_height)
+
+def reject_too_small(pool_key: str, width: int, height: int) -> dict:
+    """Flag an undersized pool item so candidate selection and case picking skip it from now on."""
+    log.info(f"{pool_key}: too small ({width}x{height}), rejected")
+    rec_update = {"rejected": "too_small", "width": int(width), "height": int(height)}
+    ia_pool_ref().child(pool_key).update(rec_update)
+    invalidate_ia_pool_index()
+    return rec_update
+
 def choose_ia_item_for_case(case_id: str) -> Optional[dict]:
     pool = ia_pool_ref().get() or {}
     if not pool:
         log.warning("choose_ia_item_for_case: pool is empty")
         return None
-    keys = sorted(pool.keys())
+    keys = sorted(k for k, r in pool.items() if ia_pool_usable(r))
+    if not keys:
+        log.warning("choose_ia_item_for_case: no pool item has an image file")
+        return None
     case_seed = seed_for_date(case_id)
-    pool_key = keys[case_seed % len(keys)]
-    log.info(f"Chosen IA pool_key for case {case_id}: {pool_key}")
-    return pool[pool_key]
+    start = case_seed % len(keys)
+    for offset in range(min(len(keys), 10)):
+        pool_key = keys[(start + offset) % len(keys)]
+        item = resolve_ia_download(pool[pool_key])
+        if item and is_too_small(item.get("width"), item.get("height")):
+            reject_too_small(pool_key, item["width"], item["height"])
+            continue
+        if item:
+            log.info(f"Chosen IA pool_key for case {case_id}: {pool_key}")
+            return item
+    return None
+
+def http_get_stream(url: str, max_bytes: int = IMAGE_MAX_BYTES):
+    """Download into a readable file object (disk-cache copy or spooled temp file), aborting past `max_bytes`."""
+    log.debug(f"HTTP GET STREAM: {url}")
+    with span("http_get_stream", url=url):
+        return http_get_cached(url, timeout=60, max_bytes=max_bytes)
+
+def decode_image(fp, max_dim: int = 4096) -> Image.Image:
+    """Decode to RGB no larger than `max_dim`, letting libjpeg downscale while decoding."""
+    img = Image.open(fp)
+    w, h = img.size
+    if w * h > IMAGE_MAX_PIXELS:
+        raise ImageTooLargeError(f"{w}x{h} exceeds IMAGE_MAX_PIXELS={IMAGE_MAX_PIXELS}")
+    if img.format == "JPEG" and max(w, h) > max_dim:
+        scale = max_dim / max(w, h)
+        # draft() picks the largest DCT reduction (1/2, 1/4, 1/8) still >= the requested size.
+        img.draft("RGB", (math.ceil(w * scale), math.ceil(h * scale)))
+        log.debug(f"JPEG draft decode {w}x{h} -> {img.size}")
+    if img.mode != "RGB":
+        img = img.convert("RGB")
+    else:
+        img.load()  # convert() would copy an already-RGB frame
+    return _resize_if_needed(img, max_dim=max_dim)
 
-def download_image_to_pil(url: str) -> Image.Image:
-    data = http_get_bytes(url)
-    img = Image.open(io.BytesIO(data)).convert("RGB")
+def download_image_to_pil(url: str, max_dim: int = 4096) -> Image.Image:
+    with http_get_stream(url) as fp:
+        img = decode_image(fp, max_dim=max_dim)
     log.debug(f"Opened image from {url} size={img.size}")
     return img
 
@@ -310,15 +1594,67 @@ def _resize_if_needed(img: Image.Image, max_dim: int = 4096) -> Image.Image:
     log.debug(f"Resizing image from {w}x{h} to {new_w}x{new_h}")
     return img.resize((new_w, new_h), Image.LANCZOS)
 
-def cache_single_ia_identifier(
-    pool_key: str,
-    overwrite: bool = False,
-    max_dim: int = 4096,
-    jpeg_quality: int = 90,
-    skip_if_restricted: bool = True,
-) -> dict:
-    rec_ref = ia_pool_ref().child(pool_key)
-    rec = rec_ref.get() or {}
+# --- Perceptual hashing: near-identical scans under different identifiers ---
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def dhash64(img: Image.Image) -> str:
+    """64-bit difference hash: sign of horizontal gradients on a 9x8 grayscale thumbnail, as 16 hex chars."""
+    px = np.asarray(img.convert("L").resize((9, 8), Image.LANCZOS, reducing_gap=3.0), dtype=np.int16)
+    return np.packbits(px[:, 1:] > px[:, :-1]).tobytes().hex()
+
+def hamming_distances(hashes: np.ndarray, hex_hash: str) -> np.ndarray:
+    """Bit distance from one hash to every entry of a uint64 array (XOR + byte popcount table)."""
+    x = np.bitwise_xor(hashes, np.uint64(int(hex_hash, 16)))
+    return _POPCOUNT8[x.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+class PHashIndex:
+    """In-memory Hamming index; each lookup is one vectorized pass over all known hashes."""
+
+    def __init__(self, entries: Optional[Dict[str, str]] = None):
+        self._lock = threading.Lock()
+        items = [(k, h) for k, h in (entries or {}).items() if h]
+        self._keys: List[str] = [k for k, _ in items]
+        self._hashes = np.array([int(h, 16) for _, h in items], dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def hashes(self, exclude: Optional[str] = None) -> np.ndarray:
+        with self._lock:
+            if exclude is None:
+                return self._hashes.copy()
+            return self._hashes[[i for i, k in enumerate(self._keys) if k != exclude]]
+
+    def add(self, key: str, hex_hash: str) -> None:
+        with self._lock:
+            self._keys.append(key)
+            self._hashes = np.append(self._hashes, np.uint64(int(hex_hash, 16)))
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            keep = [i for i, k in enumerate(self._keys) if k != key]
+            self._keys = [self._keys[i] for i in keep]
+            self._hashes = self._hashes[keep]
+
+    def match(self, hex_hash: str, exclude: Optional[str] = None, max_distance: int = PHASH_MAX_DISTANCE) -> Optional[str]:
+        """Closest key within max_distance bits, or None."""
+        with self._lock:
+            if not self._keys:
+                return None
+            d = hamming_distances(self._hashes, hex_hash)
+            for i in np.argsort(d, kind="stable"):
+                if d[i] > max_distance:
+                    return None
+                if self._keys[i] != exclude:
+                    return self._keys[i]
+            return None
+
+def load_phash_index() -> PHashIndex:
+    return PHashIndex(ia_phash_ref().get() or {})
+
+# --- Cache pipeline stages (shared by the single-item and batch paths) ---
+def _cache_precheck(pool_key: str, rec: dict, overwrite: bool, skip_if_restricted: bool) -> Optional[dict]:
+    """Returns a final result dict when the item must be skipped, else None."""
     if not rec:
         return {"pool_key": pool_key, "stored": False, "reason": "not_in_pool"}
 
@@ -331,88 +1667,186 @@ def cache_single_ia_identifier(
     if rec.get("storage_url") and not overwrite:
         log.info(f"Skipping {identifier}: already cached")
         return {"pool_key": pool_key, "stored": False, "reason": "already_cached", "storage_url": rec["storage_url"]}
+    return None
+
+def _fetch_source(pool_key: str, rec: dict) -> Tuple[bytes, float]:
+    """I/O stage: resolve the IA file if needed and download the source bytes."""
+    t0 = time.monotonic()
+    identifier = rec.get("identifier") or pool_key
+    if not rec.get("download_url") and not rec.get("storage_url"):
+        rec = resolve_ia_download(rec) or {}
+        if not rec:
+            raise ValueError("no_image_file")
 
     source_url = rec.get("storage_url") or rec.get("download_url")
     if not source_url:
-        log.warning(f"{identifier}: missing source_url")
-        return {"pool_key": pool_key, "stored": False, "reason": "missing_source_url"}
-
+        raise ValueError("missing_source_url")
+    log.info(f"Caching {identifier} from {source_url}")
     try:
-        log.info(f"Caching {identifier} from {source_url}")
-        img = download_image_to_pil(source_url)
-    except Exception as e:
-        if rec.get("download_url") and source_url != rec.get("download_url"):
-            try:
-                log.warning(f"Retrying {identifier} from IA download_url")
-                img = download_image_to_pil(rec["download_url"])
-            except Exception as e2:
-                log.exception(f"{identifier}: download failed")
-                return {"pool_key": pool_key, "stored": False, "reason": f"download_failed: {e2}"}
-        else:
-            log.exception(f"{identifier}: download failed")
-            return {"pool_key": pool_key, "stored": False, "reason": f"download_failed: {e}"}
-
-    img = _resize_if_needed(img, max_dim=max_dim)
+        with http_get_stream(source_url) as fp:
+            data = fp.read()
+    except Exception:
+        if not rec.get("download_url") or source_url == rec.get("download_url"):
+            raise
+        log.warning(f"Retrying {identifier} from IA download_url")
+        with http_get_stream(rec["download_url"]) as fp:
+            data = fp.read()
+    return data, time.monotonic() - t0
+
+def transform_ia_image(data: bytes, max_dim: int, jpeg_quality: int, known_hashes: Optional[np.ndarray] = None,
+                       min_width: int = IMAGE_MIN_DIM, min_height: int = IMAGE_MIN_DIM) -> Dict[str, Any]:
+    """CPU stage (runs in a worker process): decode, resize, hash, encode original + macro crop.
+
+    Sources under `min_width`x`min_height` return early flagged `too_small`; near-duplicates of
+    `known_hashes` return early with only the hash (no encoding)."""
+    t0 = time.monotonic()
+    img = decode_image(io.BytesIO(data), max_dim=max_dim)
     w, h = img.size
+    if is_too_small(w, h, min(min_width, max_dim), min(min_height, max_dim)):
+        return {"too_small": True, "width": w, "height": h, "elapsed_s": time.monotonic() - t0}
+    phash = dhash64(img)
+    if known_hashes is not None and len(known_hashes) and int(hamming_distances(known_hashes, phash).min()) <= PHASH_MAX_DISTANCE:
+        return {"phash": phash, "width": w, "height": h, "elapsed_s": time.monotonic() - t0}
 
-    # Upload original
     img_bytes = io.BytesIO()
     img.save(img_bytes, format="JPEG", quality=jpeg_quality, optimize=True)
-    img_bytes.seek(0)
-    img_path = f"ia_cache/{pool_key}/original.jpg"
-    storage_url = upload_bytes_to_storage(img_bytes.getvalue(), img_path, "image/jpeg")
-
-    # Upload macro crop
     crop = crop_signature_macro(img, 512)
     crop_bytes = io.BytesIO()
     crop.save(crop_bytes, format="JPEG", quality=jpeg_quality, optimize=True)
-    crop_bytes.seek(0)
-    crop_path = f"ia_cache/{pool_key}/signature_crop.jpg"
-    signature_crop_url = upload_bytes_to_storage(crop_bytes.getvalue(), crop_path, "image/jpeg")
+    return {
+        "image": img_bytes.getvalue(),
+        "crop": crop_bytes.getvalue(),
+        "derivatives": encode_derivatives(img),
+        "phash": phash,
+        "width": w,
+        "height": h,
+        "elapsed_s": time.monotonic() - t0,
+    }
 
+def _upload_cached(pool_key: str, out: Dict[str, Any]) -> Tuple[dict, float, int]:
+    """I/O stage: upload original + crop; returns the ia_pool fields to write."""
+    t0 = time.monotonic()
+    img_path = blob_path_for(hashlib.sha256(out["image"]).hexdigest(), "jpg")
+    storage_url = upload_blob_dedup(out["image"], "image/jpeg", "jpg")
+    crop_path = blob_path_for(hashlib.sha256(out["crop"]).hexdigest(), "jpg")
+    signature_crop_url = upload_blob_dedup(out["crop"], "image/jpeg", "jpg")
+    derivatives, derivative_timings = upload_derivatives(out.get("derivatives") or {})
     rec_update = {
         "storage_url": storage_url,
         "signature_crop_url": signature_crop_url,
         "image_path": img_path,
         "crop_path": crop_path,
-        "width": w,
-        "height": h,
+        "derivatives": derivatives,
+        "derivative_timings": derivative_timings,
+        "phash": out["phash"],
+        "width": out["width"],
+        "height": out["height"],
         "cached_at": datetime.now(timezone.utc).isoformat()
     }
-    rec_ref.update(rec_update)
-    log.info(f"Cached {identifier} -> {storage_url}")
-
+    nbytes = len(out["image"]) + len(out["crop"])
+    nbytes += sum(t.get("jpeg_bytes", 0) + t.get("webp_bytes", 0) for t in derivative_timings.values())
+    return rec_update, time.monotonic() - t0, nbytes
+
+def _duplicate_result(pool_key: str, phash: str, duplicate_of: str) -> Tuple[dict, dict]:
+    """(ia_pool fields, result) for an item skipped as a near-duplicate of an already cached one."""
+    log.info(f"{pool_key}: near-duplicate of {duplicate_of}, not caching")
+    rec_update = {"phash": phash, "duplicate_of": duplicate_of}
+    return rec_update, {"pool_key": pool_key, "stored": False, "reason": "near_duplicate", "duplicate_of": duplicate_of}
+
+def _too_small_result(pool_key: str, out: Dict[str, Any]) -> Tuple[dict, dict]:
+    """(ia_pool fields, result) for an item whose decoded source is below the minimum size."""
+    log.info(f"{pool_key}: too small ({out['width']}x{out['height']}), rejected")
+    rec_update = {"rejected": "too_small", "width": out["width"], "height": out["height"]}
+    return rec_update, {"pool_key": pool_key, "stored": False, "reason": "too_small",
+                        "width": out["width"], "height": out["height"]}
+
+def _cached_result(pool_key: str, rec_update: dict) -> dict:
     return {
         "pool_key": pool_key,
         "stored": True,
-        "storage_url": storage_url,
-        "signature_crop_url": signature_crop_url,
-        "width": w,
-        "height": h
+        "storage_url": rec_update["storage_url"],
+        "signature_crop_url": rec_update["signature_crop_url"],
+        "width": rec_update["width"],
+        "height": rec_update["height"]
     }
 
-def batch_cache_ia_pool(
-    limit: int = 100,
+_cache_cpu_pool: Optional[ProcessPoolExecutor] = None
+_cache_cpu_pool_lock = threading.Lock()
+
+def _cache_process_pool() -> ProcessPoolExecutor:
+    global _cache_cpu_pool
+    with _cache_cpu_pool_lock:
+        if _cache_cpu_pool is None:
+            workers = CACHE_CPU_WORKERS or (os.cpu_count() or 1)
+            _cache_cpu_pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context(CACHE_MP_CONTEXT))
+            log.info(f"Image transform process pool started: workers={workers} context={CACHE_MP_CONTEXT}")
+        return _cache_cpu_pool
+
+def cache_single_ia_identifier(
+    pool_key: str,
     overwrite: bool = False,
-    randomize: bool = True,
-    min_width: int = 800,
-    min_height: int = 800,
     max_dim: int = 4096,
     jpeg_quality: int = 90,
     skip_if_restricted: bool = True,
+    min_width: int = IMAGE_MIN_DIM,
+    min_height: int = IMAGE_MIN_DIM,
 ) -> dict:
-    pool = ia_pool_ref().get() or {}
-    log.info(f"batch_cache_ia_pool: pool_size={len(pool)}")
-    if not pool:
-        return {"ok": True, "processed": 0, "stored": 0, "skipped": 0, "results": []}
+    rec_ref = ia_pool_ref().child(pool_key)
+    rec = rec_ref.get() or {}
+    early = _cache_precheck(pool_key, rec, overwrite, skip_if_restricted)
+    if early:
+        return early
 
+    identifier = rec.get("identifier") or pool_key
+    try:
+        data, _ = _fetch_source(pool_key, rec)
+    except ValueError as e:
+        log.warning(f"{identifier}: {e}")
+        return {"pool_key": pool_key, "stored": False, "reason": str(e)}
+    except Exception as e:
+        log.exception(f"{identifier}: download failed")
+        return {"pool_key": pool_key, "stored": False, "reason": f"download_failed: {e}"}
+
+    index = load_phash_index()
+    out = transform_ia_image(data, max_dim, jpeg_quality, index.hashes(exclude=pool_key), min_width, min_height)
+    if out.get("too_small"):
+        rec_update, result = _too_small_result(pool_key, out)
+        rec_ref.update(rec_update)
+        invalidate_ia_pool_index()
+        return result
+    dup = index.match(out["phash"], exclude=pool_key)
+    if dup:
+        rec_update, result = _duplicate_result(pool_key, out["phash"], dup)
+        rec_ref.update(rec_update)
+        invalidate_ia_pool_index()
+        return result
+
+    rec_update, _, _ = _upload_cached(pool_key, out)
+    batch = RTDBBatch()
+    batch.update(f"ia_pool/{pool_key}", dict(rec_update, duplicate_of=None))
+    batch.set(f"ia_phash/{pool_key}", rec_update["phash"])
+    batch.commit()
+    invalidate_ia_pool_index()  # an overwrite may have cleared duplicate_of
+    log.info(f"Cached {identifier} -> {rec_update['storage_url']}")
+    return _cached_result(pool_key, rec_update)
+
+def select_cache_candidates(
+    pool: Dict[str, dict],
+    limit: int = 100,
+    overwrite: bool = False,
+    randomize: bool = True,
+    min_width: int = IMAGE_MIN_DIM,
+    min_height: int = IMAGE_MIN_DIM,
+) -> List[str]:
+    """Pool keys worth caching. Fields-mode records carry no dimensions yet, so they pass here and
+    the minimum size is enforced on the decoded source in transform_ia_image."""
     candidates = []
     for pkey, rec in pool.items():
+        if rec.get("no_image") or rec.get("rejected") or (rec.get("duplicate_of") and not overwrite):
+            continue
         if overwrite or not rec.get("storage_url"):
-            w = int(rec.get("width") or 0)
-            h = int(rec.get("height") or 0)
-            if (w and h) and (w < min_width or h < min_height):
-                log.debug(f"Skip {pkey}: too small {w}x{h}")
+            if is_too_small(rec.get("width"), rec.get("height"), min_width, min_height):
+                log.debug(f"Skip {pkey}: too small {rec.get('width')}x{rec.get('height')}")
                 continue
             candidates.append(pkey)
 
@@ -420,35 +1854,156 @@ def batch_cache_ia_pool(
         random.shuffle(candidates)
     candidates = candidates[:max(0, limit)]
     log.info(f"Caching candidates: {len(candidates)} (limit={limit})")
+    return candidates
 
-    results, stored, skipped = [], 0, 0
-    for pkey in candidates:
-        res = cache_single_ia_identifier(
-            pkey,
-            overwrite=overwrite,
-            max_dim=max_dim,
-            jpeg_quality=jpeg_quality,
-            skip_if_restricted=skip_if_restricted,
-        )
-        results.append(res)
-        if res.get("stored"):
-            stored += 1
-        else:
-            skipped += 1
-
-    log.info(f"batch_cache_ia_pool done: processed={len(candidates)} stored={stored} skipped={skipped}")
-    return {"ok": True, "processed": len(candidates), "stored": stored, "skipped": skipped, "results": results}
+def batch_cache_ia_pool(
+    limit: int = 100,
+    overwrite: bool = False,
+    randomize: bool = True,
+    min_width: int = IMAGE_MIN_DIM,
+    min_height: int = IMAGE_MIN_DIM,
+    max_dim: int = 4096,
+    jpeg_quality: int = 90,
+    skip_if_restricted: bool = True,
+    keys: Optional[List[str]] = None,
+) -> dict:
+    """Pipelined cacher: downloads/uploads on an I/O thread pool, decode/resize/encode on a process pool.
 
-def ensure_minimum_ia_pool(min_items: int = MIN_IA_POOL, rows: int = 100, max_pages: int = 5) -> dict:
+    `keys` caches exactly those pool items instead of selecting candidates."""
     pool = ia_pool_ref().get() or {}
-    have = len(pool)
+    log.info(f"batch_cache_ia_pool: pool_size={len(pool)}")
+    if not pool:
+        return {"ok": True, "processed": 0, "stored": 0, "skipped": 0, "results": []}
+
+    if keys is not None:
+        candidates = list(keys)
+    else:
+        candidates = select_cache_candidates(pool, limit, overwrite, randomize, min_width, min_height)
+
+    t_start = time.monotonic()
+    results: Dict[str, dict] = {}
+    queue: List[str] = []
+    for pkey in candidates:
+        early = _cache_precheck(pkey, pool.get(pkey) or {}, overwrite, skip_if_restricted)
+        if early:
+            results[pkey] = early
+        else:
+            queue.append(pkey)
+    queue.reverse()
+
+    stage_s = {"download": 0.0, "transform": 0.0, "upload": 0.0}
+    derivative_ms: Dict[str, Dict[str, float]] = {}
+    bytes_in = bytes_out = 0
+    batch = RTDBBatch()
+    index = load_phash_index() if queue else PHashIndex()
+    force_encode: set = set()
+    inflight: Dict[Future, Tuple[str, str]] = {}
+    max_inflight = CACHE_IO_WORKERS * 2  # bounds how many decoded sources sit in memory
+
+    with ThreadPoolExecutor(max_workers=CACHE_IO_WORKERS, thread_name_prefix="ia-cache-io") as io_pool:
+        cpu_pool = _cache_process_pool() if queue else None
+
+        def _fill():
+            while queue and len(inflight) < max_inflight:
+                pkey = queue.pop()
+                inflight[io_pool.submit(in_trace_context(_fetch_source), pkey, pool[pkey])] = ("download", pkey)
+
+        _fill()
+        while inflight:
+            done, _ = wait(list(inflight), return_when=FIRST_COMPLETED)
+            for fut in done:
+                stage, pkey = inflight.pop(fut)
+                try:
+                    out = fut.result()
+                except Exception as e:
+                    log.warning(f"{pkey}: {stage} failed: {e}")
+                    results[pkey] = {"pool_key": pkey, "stored": False, "reason": f"{stage}_failed: {e}"}
+                    if stage == "upload":
+                        index.discard(pkey)
+                    continue
+                if stage == "download":
+                    data, elapsed = out
+                    stage_s["download"] += elapsed
+                    bytes_in += len(data)
+                    known = None if pkey in force_encode else index.hashes(exclude=pkey)
+                    inflight[cpu_pool.submit(transform_ia_image, data, max_dim, jpeg_quality, known,
+                                             min_width, min_height)] = ("transform", pkey)
+                elif stage == "transform":
+                    stage_s["transform"] += out["elapsed_s"]
+                    if out.get("too_small"):
+                        rec_update, results[pkey] = _too_small_result(pkey, out)
+                        batch.update(f"ia_pool/{pkey}", rec_update)
+                        continue
+                    dup = index.match(out["phash"], exclude=pkey)
+                    if dup:
+                        rec_update, results[pkey] = _duplicate_result(pkey, out["phash"], dup)
+                        batch.update(f"ia_pool/{pkey}", rec_update)
+                        continue
+                    if "image" not in out:
+                        # Matched a sibling whose upload has since failed: fetch again and encode it after all.
+                        force_encode.add(pkey)
+                        queue.append(pkey)
+                        continue
+                    # Claim the hash before uploading so later siblings in this batch see it.
+                    index.add(pkey, out["phash"])
+                    inflight[io_pool.submit(in_trace_context(_upload_cached), pkey, out)] = ("upload", pkey)
+                else:
+                    rec_update, elapsed, nbytes = out
+                    stage_s["upload"] += elapsed
+                    bytes_out += nbytes
+                    for name, t in rec_update["derivative_timings"].items():
+                        acc = derivative_ms.setdefault(name, {})
+                        for k, v in t.items():
+                            acc[k] = round(acc.get(k, 0) + v, 1)
+                    batch.update(f"ia_pool/{pkey}", dict(rec_update, duplicate_of=None))
+                    batch.set(f"ia_phash/{pkey}", rec_update["phash"])
+                    results[pkey] = _cached_result(pkey, rec_update)
+                    log.info(f"Cached {pool[pkey].get('identifier') or pkey} -> {rec_update['storage_url']}")
+            _fill()
+
+    batch.commit()
+    invalidate_ia_pool_index()
+
+    ordered = [results[p] for p in candidates]
+    stored = sum(1 for r in ordered if r.get("stored"))
+    duplicates = sum(1 for r in ordered if r.get("reason") == "near_duplicate")
+    too_small = sum(1 for r in ordered if r.get("reason") == "too_small")
+    skipped = len(ordered) - stored
+    wall = time.monotonic() - t_start
+    timings = {
+        "wall_s": round(wall, 3),
+        "download_s": round(stage_s["download"], 3),
+        "transform_s": round(stage_s["transform"], 3),
+        "upload_s": round(stage_s["upload"], 3),
+        "items_per_s": round(stored / wall, 2) if wall > 0 else None,
+        "mb_in_per_s": round(bytes_in / 1e6 / wall, 2) if wall > 0 else None,
+        "mb_in": round(bytes_in / 1e6, 2),
+        "mb_out": round(bytes_out / 1e6, 2),
+        "derivatives": derivative_ms,
+    }
+    log.info(f"batch_cache_ia_pool done: processed={len(candidates)} stored={stored} skipped={skipped} timings={timings}")
+    return {"ok": True, "processed": len(candidates), "stored": stored, "skipped": skipped, "duplicates": duplicates, "too_small": too_small,
+            "timings": timings, "results": ordered}
+
+def ensure_minimum_ia_pool(
+    min_items: int = MIN_IA_POOL,
+    rows: int = 100,
+    max_pages: int = 5,
+    query: Optional[str] = None,
+    cache: bool = True,
+) -> dict:
+    # Only usable items count: no_image / duplicate / rejected records would otherwise hide a starving pool.
+    have = ia_pool_usable_count(cached=True)
     added = 0
     cached = 0
     log.info(f"ensure_minimum_ia_pool: have={have}, target={min_items}")
+    if have >= min_items:
+        # The common case (every plan_case calls this): one cache lookup, no RTDB read.
+        return {"ok": True, "had": have, "added": 0, "cached": 0, "final_size": have, "need_cache": 0}
 
     candidate_queries = []
-    if DEFAULT_IA_QUERY:
-        candidate_queries.append(DEFAULT_IA_QUERY)
+    if query or DEFAULT_IA_QUERY:
+        candidate_queries.append(query or DEFAULT_IA_QUERY)
     candidate_queries.extend([q for q in FALLBACK_IA_QUERIES if q not in candidate_queries])
 
     for q in candidate_queries:
@@ -465,112 +2020,630 @@ def ensure_minimum_ia_pool(min_items: int = MIN_IA_POOL, rows: int = 100, max_pa
             log.info(f"IA search page={page} -> {len(docs)} docs for query {q!r}")
             if not docs:
                 break
-            for d in docs:
-                ident = d.get("identifier")
-                if not ident:
-                    continue
-                if ia_pool_ref().child(fb_key(ident)).get():
-                    continue
-                try:
-                    rec = ingest_ia_doc(d)
-                    if rec:
-                        added += 1
-                except Exception:
-                    log.exception(f"Ingest failed for {ident}")
-                    continue
-                if have + added >= min_items:
-                    break
+            res = ingest_ia_docs(docs, limit=min_items - (have + added))
+            added += len(res["records"])
             page += 1
 
-    pool = ia_pool_ref().get() or {}
-    have_now = len(pool)
+    have_now = ia_pool_usable_count()
     need_cache = max(0, min_items - have_now)
     log.info(f"ensure_minimum_ia_pool: post-ingest have={have_now}, need_cache={need_cache}")
-    if need_cache:
+    if need_cache and cache:
         res = batch_cache_ia_pool(limit=need_cache, randomize=True)
         cached = res.get("stored", 0)
 
-    final_size = len(ia_pool_ref().get() or {})
-    stats = {"ok": True, "had": have, "added": added, "cached": cached, "final_size": final_size}
+    final_size = ia_pool_usable_count()
+    stats = {"ok": True, "had": have, "added": added, "cached": cached, "final_size": final_size, "need_cache": need_cache}
     log.info(f"ensure_minimum_ia_pool: stats={stats}")
     return stats
 
-# -----------------------------------------------------------------------------
-# 4) CASE GENERATION (uses IA for authentic image, Gemini for forgeries/meta)
-# -----------------------------------------------------------------------------
-def ensure_case_generated(case_id: str) -> Dict[str, Any]:
-    existing_public = case_ref(case_id).child("public").get()
-    if existing_public:
-        log.info(f"Case {case_id} already exists")
-        return existing_public
-
-    # Ensure we have a cached pool ready
-    try:
-        stats = ensure_minimum_ia_pool()
-        log.debug(f"Bootstrap stats for case {case_id}: {stats}")
-    except Exception:
-        log.exception("Bootstrap failed inside ensure_case_generated")
-
-    ia_item = choose_ia_item_for_case(case_id)
-    if not ia_item:
-        raise RuntimeError("No IA items available. Ingest needed.")
-
-    case_seed = seed_for_date(case_id)
-    mode = "knowledge" if (case_seed % 2 == 0) else "observation"
-    log.info(f"Case {case_id}: mode={mode}")
+# --- Admin jobs: ingest / cache / bootstrap run in the background with RTDB-persisted progress ---
+# admin_jobs/{id} holds the job document (params, status, progress, checkpoint, per-item results);
+# admin_jobs_active/{id} = {owner, heartbeat_at} is the lease + index of unfinished jobs.
+def admin_jobs_ref():
+    return db_root.child("admin_jobs")
+
+def admin_jobs_active_ref():
+    return db_root.child("admin_jobs_active")
+
+class JobContext:
+    """What a job function sees: its params, the last checkpoint, and atomic progress/result writes."""
+
+    def __init__(self, job_id: str, doc: Dict[str, Any]):
+        self.job_id = job_id
+        self.params: Dict[str, Any] = doc.get("params") or {}
+        self.checkpoint: Dict[str, Any] = doc.get("checkpoint") or {}
+
+    def save(self, checkpoint: Optional[Dict[str, Any]] = None, progress: Optional[Dict[str, Any]] = None,
+             results: Optional[Dict[str, Any]] = None) -> None:
+        """Checkpoint, progress and results land together, so a resumed job never double counts."""
+        base = f"admin_jobs/{self.job_id}"
+        now = time.time()
+        batch = RTDBBatch()
+        if checkpoint is not None:
+            self.checkpoint = checkpoint
+            batch.set(f"{base}/checkpoint", checkpoint)
+        if progress:
+            batch.update(f"{base}/progress", progress)
+        for key, value in (results or {}).items():
+            batch.set(f"{base}/results/{fb_key(key)}", value)
+        batch.set(f"{base}/heartbeat_at", now)
+        batch.set(f"admin_jobs_active/{self.job_id}/heartbeat_at", now)
+        batch.commit()
+
+def _job_ingest_ia(ctx: JobContext) -> Dict[str, Any]:
+    query = ctx.params.get("query") or DEFAULT_IA_QUERY
+    pages = int(ctx.params.get("pages") or 2)
+    rows = int(ctx.params.get("rows") or 100)
+    cp = ctx.checkpoint
+    page, ingested, errors = int(cp.get("next_page", 1)), int(cp.get("ingested", 0)), int(cp.get("errors", 0))
+    log.info(f"Ingest job {ctx.job_id}: query='{query}' pages={pages} rows={rows} from page {page}")
+
+    while page <= pages:
+        try:
+            res = ingest_ia_docs(ia_advanced_search(query, rows=rows, page=page))
+            n, e = len(res["records"]), res["errors"]
+        except Exception:
+            n, e = 0, 1
+        ingested += n
+        errors += e
+        ctx.save(
+            checkpoint={"next_page": page + 1, "ingested": ingested, "errors": errors},
+            progress={"done": page, "total": pages, "ingested": ingested, "errors": errors},
+            results={f"page_{page}": {"ingested": n, "errors": e}},
+        )
+        page += 1
+    return {"ok": True, "ingested": ingested, "errors": errors, "pool_size": len(ia_pool_keys())}
 
-    style_period = "sourced from Internet Archive; museum catalog reproduction"
+def _cache_job_options(params: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "overwrite": bool(params.get("overwrite", False)),
+        "max_dim": int(params.get("max_dim", 4096)),
+        "jpeg_quality": int(params.get("jpeg_quality", 90)),
+        "skip_if_restricted": bool(params.get("skip_if_restricted", True)),
+    }
 
-    source_url = ia_item.get("storage_url") or ia_item["download_url"]
-    log.info(f"Case {case_id}: authentic source={source_url}")
-    auth_img = download_image_to_pil(source_url)
+def _run_cache_chunks(ctx: JobContext, options: Dict[str, Any]) -> Dict[str, int]:
+    """Cache checkpoint["keys"] from checkpoint["next"] on, ADMIN_JOB_CHUNK items per checkpoint."""
+    keys: List[str] = ctx.checkpoint.get("keys") or []
+    totals = dict({"stored": 0, "skipped": 0, "duplicates": 0, "too_small": 0}, **(ctx.checkpoint.get("totals") or {}))
+    for i in range(int(ctx.checkpoint.get("next", 0)), len(keys), ADMIN_JOB_CHUNK):
+        chunk = keys[i:i + ADMIN_JOB_CHUNK]
+        out = batch_cache_ia_pool(keys=chunk, **options)
+        for k in totals:
+            totals[k] += int(out.get(k) or 0)
+        done = i + len(chunk)
+        ctx.save(
+            checkpoint=dict(ctx.checkpoint, next=done, totals=totals),
+            progress=dict(totals, done=done, total=len(keys)),
+            results={r["pool_key"]: r for r in out["results"]},
+        )
+    return totals
+
+def _job_cache_ia(ctx: JobContext) -> Dict[str, Any]:
+    if "keys" not in ctx.checkpoint:
+        p = ctx.params
+        keys = select_cache_candidates(
+            ia_pool_ref().get() or {},
+            limit=int(p.get("limit", 100)),
+            overwrite=bool(p.get("overwrite", False)),
+            randomize=bool(p.get("randomize", True)),
+            min_width=int(p.get("min_width", IMAGE_MIN_DIM)),
+            min_height=int(p.get("min_height", IMAGE_MIN_DIM)),
+        )
+        ctx.save(checkpoint={"keys": keys, "next": 0}, progress={"done": 0, "total": len(keys)})
+    totals = _run_cache_chunks(ctx, _cache_job_options(ctx.params))
+    return dict(totals, ok=True, processed=len(ctx.checkpoint["keys"]))
+
+def _job_bootstrap(ctx: JobContext) -> Dict[str, Any]:
+    p = ctx.params
+    if ctx.checkpoint.get("phase") != "cache":
+        # Ingest is naturally resumable: it only tops the pool up to min_items.
+        stats = ensure_minimum_ia_pool(
+            min_items=int(p.get("min_items", MIN_IA_POOL)),
+            rows=int(p.get("rows", 100)),
+            max_pages=int(p.get("max_pages", 5)),
+            query=p.get("query"),
+            cache=False,
+        )
+        keys = select_cache_candidates(ia_pool_ref().get() or {}, limit=stats["need_cache"]) if stats["need_cache"] else []
+        ctx.save(checkpoint={"phase": "cache", "stats": stats, "keys": keys, "next": 0},
+                 progress={"phase": "cache", "done": 0, "total": len(keys)})
+    totals = _run_cache_chunks(ctx, _cache_job_options({}))
+    stats = dict(ctx.checkpoint["stats"], cached=totals["stored"], final_size=ia_pool_usable_count())
+    return {"ok": True, "stats": stats, "effective_query": p.get("query") or DEFAULT_IA_QUERY}
+
+ADMIN_JOB_KINDS = {
+    "ingest_ia": _job_ingest_ia,
+    "cache_ia": _job_cache_ia,
+    "bootstrap": _job_bootstrap,
+}
+
+class AdminJobRunner:
+    """Runs admin jobs on a small bounded pool; state lives in RTDB so a restart (or another worker) resumes them.
+
+    Every job this process holds, queued or running, is heartbeated by one thread, and at most
+    ADMIN_JOB_CONCURRENCY jobs run per host (flock'd slot files shared by all workers)."""
+
+    def __init__(self, concurrency: int = ADMIN_JOB_CONCURRENCY):
+        self._executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="admin-job")
+        self._mine: set = set()  # queued or running in this process
+        self._lock = threading.Lock()
+        self._beat_lock = threading.Lock()  # a heartbeat write never lands after a job's final write
+        self._thread: Optional[threading.Thread] = None
+        self._beat_thread: Optional[threading.Thread] = None
+
+    def _create(self, kind: str, params: Dict[str, Any]) -> str:
+        if kind not in ADMIN_JOB_KINDS:
+            raise ValueError(f"unknown job kind: {kind}")
+        job_id = _action_key()
+        now = time.time()
+        batch = RTDBBatch()
+        batch.set(f"admin_jobs/{job_id}", {
+            "id": job_id,
+            "kind": kind,
+            "params": params,
+            "status": "queued",
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "owner": WORKER_ID,
+            "heartbeat_at": now,
+            "attempts": 0,
+        })
+        batch.set(f"admin_jobs_active/{job_id}", {"owner": WORKER_ID, "heartbeat_at": now})
+        batch.commit()
+        self._hold(job_id)
+        log.info(f"Admin job {job_id} ({kind}) queued: {params}")
+        return job_id
+
+    def _hold(self, job_id: str) -> None:
+        """Count the job as this process's (queued or running) so the heartbeat thread keeps its lease fresh."""
+        with self._lock:
+            self._mine.add(job_id)
+            if self._beat_thread is None or not self._beat_thread.is_alive():
+                self._beat_thread = threading.Thread(target=self._beat_loop, name="admin-job-heartbeat", daemon=True)
+                self._beat_thread.start()
+
+    def _beat_loop(self) -> None:
+        while True:
+            time.sleep(ADMIN_JOB_HEARTBEAT)
+            with self._beat_lock:
+                with self._lock:
+                    held = sorted(self._mine)
+                if not held:
+                    continue
+                now = time.time()
+                batch = RTDBBatch()
+                for job_id in held:
+                    batch.set(f"admin_jobs/{job_id}/heartbeat_at", now)
+                    batch.set(f"admin_jobs_active/{job_id}/heartbeat_at", now)
+                try:
+                    batch.commit()
+                except Exception as e:
+                    log.warning(f"Admin job heartbeat failed for {held}: {e}")
 
-    images_urls: List[str] = []
-    signature_crops: List[str] = []
+    @contextlib.contextmanager
+    def _host_slot(self, job_id: str):
+        """Hold one of ADMIN_JOB_CONCURRENCY slots shared by every process on the host while the job runs."""
+        try:
+            import fcntl
+        except ImportError:  # no flock (Windows dev server): single process, the executor size is the cap
+            yield
+            return
+        waiting = False
+        while True:
+            for i in range(max(1, ADMIN_JOB_CONCURRENCY)):
+                fd = os.open(os.path.join(ADMIN_JOB_LOCK_DIR, f"hidden_stroke_admin_job_{i}.lock"), os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    os.close(fd)
+                    continue
+                try:
+                    yield
+                finally:
+                    os.close(fd)  # releases the flock
+                return
+            if not waiting:
+                log.info(f"Admin job {job_id}: all {ADMIN_JOB_CONCURRENCY} host slots busy, staying queued")
+                waiting = True
+            time.sleep(1.0)
+
+    def submit(self, kind: str, params: Dict[str, Any]) -> str:
+        job_id = self._create(kind, params)
+        self._executor.submit(self.run, job_id)
+        return job_id
+
+    def run_sync(self, kind: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Same bookkeeping as submit(), but runs in the calling thread and returns the final job document."""
+        job_id = self._create(kind, params)
+        self.run(job_id)
+        return admin_jobs_ref().child(job_id).get() or {}
+
+    def _claim(self, job_id: str) -> bool:
+        def _take(current):
+            if current is None or not current.get("owner"):
+                return None  # finished meanwhile (an ownerless node is a late heartbeat write: drop it)
+            live = time.time() - float(current.get("heartbeat_at") or 0) < ADMIN_JOB_STALE
+            if current.get("owner") != WORKER_ID and live:
+                return current
+            return {"owner": WORKER_ID, "heartbeat_at": time.time()}
+        lease = admin_jobs_active_ref().child(job_id).transaction(_take) or {}
+        return lease.get("owner") == WORKER_ID
+
+    def run(self, job_id: str) -> None:
+        try:
+            if not self._claim(job_id):
+                log.info(f"Admin job {job_id}: owned by another live worker or already finished")
+                return
+            with self._host_slot(job_id):
+                self._run_claimed(job_id)
+        finally:
+            with self._lock:
+                self._mine.discard(job_id)
+
+    def _run_claimed(self, job_id: str) -> None:
+        jref = admin_jobs_ref().child(job_id)
+        doc = jref.get() or {}
+        fn = ADMIN_JOB_KINDS.get(doc.get("kind"))
+        attempts = int(doc.get("attempts") or 0) + 1
+        jref.update({
+            "status": "running",
+            "owner": WORKER_ID,
+            "attempts": attempts,
+            "started_at": doc.get("started_at") or datetime.now(timezone.utc).isoformat(),
+        })
+        if doc.get("checkpoint"):
+            log.info(f"Admin job {job_id}: resuming (attempt {attempts}) from checkpoint")
+
+        t0 = time.monotonic()
+        result, error = None, None
+        try:
+            if fn is None:
+                raise ValueError(f"unknown job kind: {doc.get('kind')}")
+            with trace_root("admin_job", job_id=job_id, job_kind=doc.get("kind")):
+                result = fn(JobContext(job_id, doc))
+            status = "done"
+        except Exception as e:
+            log.exception(f"Admin job {job_id} failed")
+            status, error = "failed", str(e)
+
+        batch = RTDBBatch()
+        batch.update(f"admin_jobs/{job_id}", {
+            "status": status,
+            "result": result,
+            "error": error,
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "elapsed_s": round(time.monotonic() - t0, 2),
+        })
+        batch.set(f"admin_jobs_active/{job_id}", None)
+        with self._beat_lock:  # no heartbeat can resurrect the lease deleted here
+            batch.commit()
+            with self._lock:
+                self._mine.discard(job_id)
+        log.info(f"Admin job {job_id} {status} in {time.monotonic() - t0:.1f}s")
+
+    def resume(self) -> List[str]:
+        """Re-queue unfinished jobs whose owner stopped heartbeating (e.g. this process before a restart).
+
+        Jobs queued in a live worker are heartbeated too, so they are never picked up twice."""
+        resumed = []
+        for job_id, lease in sorted((admin_jobs_active_ref().get() or {}).items()):
+            with self._lock:
+                if job_id in self._mine:
+                    continue
+                if time.time() - float((lease or {}).get("heartbeat_at") or 0) < ADMIN_JOB_STALE:
+                    continue
+            if not self._claim(job_id):  # claim before heartbeating so we never refresh another worker's lease
+                continue
+            self._hold(job_id)
+            self._executor.submit(self.run, job_id)
+            resumed.append(job_id)
+        if resumed:
+            log.info(f"Admin jobs resumed: {resumed}")
+        return resumed
+
+    def _loop(self):
+        while True:
+            try:
+                self.resume()
+            except Exception:
+                log.exception("Admin job resume pass failed")
+            time.sleep(max(5, ADMIN_JOB_STALE // 2))
 
-    url1 = save_image_return_url(auth_img, f"hidden_stroke/{case_id}/images/img_1.jpg")
-    images_urls.append(url1)
-    log.debug(f"Case {case_id}: saved authentic -> {url1}")
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._loop, name="admin-job-resume", daemon=True)
+        self._thread.start()
+        log.info(f"Admin job runner started (concurrency={ADMIN_JOB_CONCURRENCY}, stale={ADMIN_JOB_STALE}s)")
 
-    crop1 = crop_signature_macro(auth_img, 512)
-    crop1_url = save_image_return_url(crop1, f"hidden_stroke/{case_id}/signature_crops/crop_1.jpg", quality=88)
-    signature_crops.append(crop1_url)
-    log.debug(f"Case {case_id}: saved authentic crop -> {crop1_url}")
+job_runner = AdminJobRunner()
 
-    if mode == "knowledge":
-        for _ in [2, 3]:
-            images_urls.append(images_urls[0])
-            signature_crops.append(signature_crops[0])
+# -----------------------------------------------------------------------------
+# 4) CASE GENERATION (uses IA for authentic image, Gemini for forgeries/meta)
+# -----------------------------------------------------------------------------
+class CaseWarmingError(RuntimeError):
+    """Raised when another worker holds the generation lease for a case."""
+
+    def __init__(self, case_id: str, retry_after: int):
+        super().__init__(f"Case {case_id} is being generated; retry in {retry_after}s")
+        self.case_id = case_id
+        self.retry_after = retry_after
+
+_case_locks: Dict[str, threading.Lock] = {}
+_case_locks_guard = threading.Lock()
+
+def _case_lock(case_id: str) -> threading.Lock:
+    with _case_locks_guard:
+        return _case_locks.setdefault(case_id, threading.Lock())
+
+def acquire_case_lease(case_id: str, owner: str) -> bool:
+    """Take cases/{id}/_lease via an RTDB transaction unless another live owner holds it."""
+    def _take(current):
+        if current and current.get("owner") != owner and float(current.get("expires_at") or 0) > time.time():
+            return current
+        return {"owner": owner, "expires_at": time.time() + CASE_LEASE_SECONDS}
+    lease = case_ref(case_id).child("_lease").transaction(_take) or {}
+    return lease.get("owner") == owner
+
+def renew_case_lease(case_id: str, owner: str) -> bool:
+    """Push our lease's expiry out again; False once another worker has taken it over."""
+    def _renew(current):
+        if not current or current.get("owner") != owner:
+            return current
+        return dict(current, expires_at=time.time() + CASE_LEASE_SECONDS)
+    lease = case_ref(case_id).child("_lease").transaction(_renew) or {}
+    return lease.get("owner") == owner
+
+@contextlib.contextmanager
+def case_lease_heartbeat(case_id: str, owner: str):
+    """Renew the lease every CASE_LEASE_SECONDS / 3 while a build runs, however long it takes."""
+    stop = threading.Event()
+
+    def beat():
+        while not stop.wait(max(1.0, CASE_LEASE_SECONDS / 3)):
+            try:
+                if not renew_case_lease(case_id, owner):
+                    log.warning(f"Case {case_id}: lease lost to another worker")
+                    return
+            except Exception as e:
+                log.warning(f"Case {case_id}: lease renewal failed: {e}")
+
+    t = threading.Thread(target=beat, name=f"case-lease-{case_id}", daemon=True)
+    t.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        t.join()
+
+class CaseLeaseLostError(RuntimeError):
+    """The build outlived its lease and another worker took it: this build must not publish."""
+
+def release_case_lease(case_id: str, owner: str) -> None:
+    lref = case_ref(case_id).child("_lease")
+    if (lref.child("owner").get() or "") == owner:
+        lref.delete()
+
+def _wait_for_case(case_id: str, timeout: float) -> Dict[str, Any]:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        public = get_case_public(case_id)
+        if public:
+            return public
+        time.sleep(1.0)
+    return {}
+
+def ensure_case_generated(case_id: str, force: bool = False) -> Dict[str, Any]:
+    """Single-flight case generation: one thread per process, one process per lease."""
+    if force:
+        invalidate_case_cache(case_id)
     else:
-        for i in range(2):
-            forg_prompt = """
+        existing_public = get_case_public(case_id)
+        if existing_public:
+            log.info(f"Case {case_id} already exists")
+            return existing_public
+
+    lock = _case_lock(case_id)
+    if not lock.acquire(timeout=CASE_WARMING_WAIT):
+        log.info(f"Case {case_id}: generation in progress in this process, asking client to retry")
+        raise CaseWarmingError(case_id, int(CASE_WARMING_WAIT))
+    try:
+        if not force:
+            existing_public = get_case_public(case_id)
+            if existing_public:
+                return existing_public
+        owner = f"{WORKER_ID}:{threading.get_ident()}"
+        if not acquire_case_lease(case_id, owner):
+            log.info(f"Case {case_id}: lease held by another worker, waiting up to {CASE_WARMING_WAIT}s")
+            with span("wait_for_case", case_id=case_id):
+                public = {} if force else _wait_for_case(case_id, CASE_WARMING_WAIT)
+            if public:
+                return public
+            raise CaseWarmingError(case_id, int(CASE_WARMING_WAIT))
+        try:
+            with case_lease_heartbeat(case_id, owner), trace_root("generate_case", case_id=case_id, fresh=force):
+                return generate_case(case_id, fresh=force, lease_owner=owner)
+        except CaseLeaseLostError as e:
+            log.warning(str(e))
+            raise CaseWarmingError(case_id, int(CASE_WARMING_WAIT))
+        finally:
+            release_case_lease(case_id, owner)
+    finally:
+        lock.release()
+
+FORGERY_PROMPT = """
 Create a near-identical variant of the provided painting. 
 Keep composition, palette, and lighting the same.
 Only introduce a subtle change in signature micro-geometry (baseline alignment, stroke overlap order, or curve spacing).
 No annotations. Differences must be visible only at macro zoom.
 """
-            log.info(f"Case {case_id}: generating forgery {i+1}")
-            resp = client.models.generate_content(
-                model=GENERATION_MODEL,
-                contents=[forg_prompt, auth_img],
-                config=types.GenerateContentConfig(response_modalities=["IMAGE"])
-            )
-            f_img = None
-            for p in resp.candidates[0].content.parts:
-                if getattr(p, "inline_data", None):
-                    f_img = pil_from_inline_image_part(p)
-                    break
-            if f_img is None:
-                log.warning("Gemini returned no image; falling back to copy of authentic")
-                f_img = auth_img.copy()
 
-            url = save_image_return_url(f_img, f"hidden_stroke/{case_id}/images/img_{i+2}.jpg")
-            images_urls.append(url)
-            crop = crop_signature_macro(f_img, 512)
-            c_url = save_image_return_url(crop, f"hidden_stroke/{case_id}/signature_crops/crop_{i+2}.jpg", quality=88)
-            signature_crops.append(c_url)
-            log.debug(f"Case {case_id}: forgery saved -> {url}; crop -> {c_url}")
+_gemini_executor = ThreadPoolExecutor(max_workers=GEMINI_MAX_WORKERS, thread_name_prefix="gemini")
+# Set by a build that gave up on its Gemini batch (see abandon_gemini); checked before every attempt.
+_gemini_cancel: "contextvars.ContextVar[Optional[threading.Event]]" = contextvars.ContextVar("gemini_cancel", default=None)
+
+class GeminiCancelledError(RuntimeError):
+    """The build this call belongs to has given up on it; no further attempts are made."""
+
+def _gemini_http_options():
+    return types.HttpOptions(timeout=int(GEMINI_TIMEOUT * 1000))
+
+def _gemini_retryable(e: Exception) -> bool:
+    """Transport failures, timeouts, 429 and 5xx are worth another attempt; other API errors are not."""
+    if isinstance(e, genai_errors.APIError):
+        return e.code in HTTP_RETRY_STATUSES
+    httpx = importlib.import_module("httpx")  # google-genai's transport
+    return isinstance(e, (httpx.TransportError, requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError))
+
+def gemini_generate(model: str, contents: List[Any], config: Any) -> Any:
+    """client.models.generate_content with GEMINI_MAX_RETRIES backed-off retries on transient errors.
+
+    Every attempt is timed into hs_gemini_call_duration_seconds."""
+    cancel = _gemini_cancel.get()
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        if cancel is not None and cancel.is_set():
+            raise GeminiCancelledError(f"Gemini {model}: build abandoned the call before attempt {attempt + 1}")
+        t0 = time.perf_counter()
+        outcome = "error"
+        try:
+            with span("gemini.generate_content", model=model, attempt=attempt):
+                resp = client.models.generate_content(model=model, contents=contents, config=config)
+            outcome = "ok"
+            return resp
+        except Exception as e:
+            if attempt == GEMINI_MAX_RETRIES or not _gemini_retryable(e):
+                raise
+            delay = _backoff_delay(attempt)
+            log.warning(f"Gemini {model} failed ({e.__class__.__name__}: {e}); retry {attempt + 1} in {delay:.2f}s")
+        finally:
+            _gemini_latency.observe(time.perf_counter() - t0, model, outcome)
+        if cancel is not None:
+            cancel.wait(delay)  # wakes early once the build gives up
+        else:
+            time.sleep(delay)
+    raise RuntimeError("unreachable")
+
+def gemini_input_part(img: Image.Image) -> Any:
+    """Downscale + JPEG-encode the reference image once; the same part is reused by every call."""
+    small = _resize_if_needed(img, max_dim=GEMINI_INPUT_MAX_DIM)
+    b = io.BytesIO()
+    small.save(b, format="JPEG", quality=90)
+    log.debug(f"Gemini input image: {img.size} -> {small.size}, {len(b.getvalue())} bytes")
+    return types.Part.from_bytes(data=b.getvalue(), mime_type="image/jpeg")
+
+def generate_forgery(case_id: str, i: int, input_part: Any, auth_img: Image.Image,
+                     pixels: Optional[Dict[str, Image.Image]] = None) -> Dict[str, Any]:
+    """One Gemini forgery; the decoded image is left in `pixels` (by blob URL) for the tile stage."""
+    log.info(f"Case {case_id}: generating forgery {i+1}")
+    resp = gemini_generate(
+        model=GENERATION_MODEL,
+        contents=[FORGERY_PROMPT, input_part],
+        config=types.GenerateContentConfig(response_modalities=["IMAGE"], http_options=_gemini_http_options())
+    )
+    f_img = None
+    for p in resp.candidates[0].content.parts:
+        if getattr(p, "inline_data", None):
+            f_img = pil_from_inline_image_part(p)
+            break
+    if f_img is None:
+        log.warning("Gemini returned no image; falling back to copy of authentic")
+        f_img = auth_img.copy()
+
+    url = save_image_return_url(f_img)
+    if pixels is not None:
+        pixels[url] = f_img
+    crop = crop_signature_macro(f_img, 512)
+    c_url = save_image_return_url(crop, quality=88)
+    log.debug(f"Case {case_id}: forgery saved -> {url}; crop -> {c_url}")
+    return dict(build_derivatives(f_img, f"{case_id}/forgery_{i+1}"), image_url=url, crop_url=c_url)
+
+_JSON_FENCE = re.compile(r"```(?:json)?\s*(.*?)```", re.S | re.I)
+
+def parse_metadata_json(raw_text: str) -> Dict[str, Any]:
+    """The reply as JSON, else its first fenced block (wherever it sits), else its outermost {...} span."""
+    cleaned = raw_text.strip()
+    try:
+        data = json.loads(cleaned)
+    except ValueError:
+        fence = _JSON_FENCE.search(cleaned)
+        if fence:
+            cleaned = fence.group(1)
+        elif "{" in cleaned:
+            cleaned = cleaned[cleaned.index("{"):cleaned.rindex("}") + 1]
+        data = json.loads(cleaned)
+    if not isinstance(data, dict):
+        raise ValueError("metadata response is not a JSON object")
+    return data
+
+META_BUNDLE_FIELDS = ("title", "year", "medium", "ink_or_pigment", "catalog_ref", "ownership_chain", "notes")
+
+def validate_case_metadata(meta_json: Dict[str, Any]) -> Dict[str, Any]:
+    """Check the Gemini metadata document against the prompt schema; returns a normalised copy."""
+    def _str(v, where):
+        if not isinstance(v, (str, int, float)):
+            raise ValueError(f"{where}: expected string, got {type(v).__name__}")
+        return str(v)
+
+    def _str_list(v, where):
+        if not isinstance(v, list):
+            raise ValueError(f"{where}: expected list")
+        return [_str(x, f"{where}[{i}]") for i, x in enumerate(v)]
+
+    metadata = meta_json.get("metadata")
+    if not isinstance(metadata, list) or len(metadata) != 3:
+        raise ValueError("Expected exactly 3 metadata bundles.")
+    bundles = []
+    for i, b in enumerate(metadata):
+        if not isinstance(b, dict):
+            raise ValueError(f"metadata[{i}]: expected object")
+        missing = [k for k in META_BUNDLE_FIELDS if k not in b]
+        if missing:
+            raise ValueError(f"metadata[{i}]: missing {missing}")
+        bundle = {k: _str(b[k], f"metadata[{i}].{k}") for k in META_BUNDLE_FIELDS if k != "ownership_chain"}
+        bundle["ownership_chain"] = _str_list(b["ownership_chain"], f"metadata[{i}].ownership_chain")
+        bundles.append(bundle)
+
+    solution = meta_json.get("solution")
+    if not isinstance(solution, dict):
+        raise ValueError("solution: expected object")
+    try:
+        answer_index = int(solution.get("answer_index"))
+    except (TypeError, ValueError):
+        raise ValueError("solution.answer_index: expected integer")
+    if answer_index not in (0, 1, 2):
+        raise ValueError(f"solution.answer_index out of range: {answer_index}")
 
+    return {
+        "case_brief": _str(meta_json.get("case_brief") or "A resurfaced portrait raises questions—its paper trail glitters a little too perfectly.", "case_brief"),
+        "metadata": bundles,
+        "ledger_summary": _str(meta_json.get("ledger_summary") or "", "ledger_summary"),
+        "solution": {
+            "answer_index": answer_index,
+            "flags_signature": _str_list(solution.get("flags_signature") or [], "solution.flags_signature"),
+            "flags_metadata": _str_list(solution.get("flags_metadata") or [], "solution.flags_metadata"),
+            "flags_financial": _str_list(solution.get("flags_financial") or [], "solution.flags_financial"),
+            "explanation": _str(solution.get("explanation") or "The authentic work aligns with period-accurate details; the others contain subtle contradictions.", "solution.explanation"),
+        },
+    }
+
+def metadata_from_checkpoint(meta: Dict[str, Any]) -> Dict[str, Any]:
+    """Undo RTDB's storage quirks: empty lists (and empty strings) come back as missing keys."""
+    solution = meta.get("solution") or {}
+    return dict(
+        meta,
+        case_brief=meta.get("case_brief") or "",
+        ledger_summary=meta.get("ledger_summary") or "",
+        metadata=[dict(b, ownership_chain=b.get("ownership_chain") or []) for b in (meta.get("metadata") or []) if b],
+        solution=dict(
+            solution,
+            flags_signature=solution.get("flags_signature") or [],
+            flags_metadata=solution.get("flags_metadata") or [],
+            flags_financial=solution.get("flags_financial") or [],
+            explanation=solution.get("explanation") or "",
+        ),
+    )
+
+def generate_case_metadata(case_id: str, mode: str, ia_item: Dict[str, Any]) -> Dict[str, Any]:
     title = ia_item.get("title") or "Untitled"
     creator = ia_item.get("creator") or ""
     date = ia_item.get("date") or ""
@@ -616,74 +2689,307 @@ OUTPUT STRICT JSON with this schema:
   }}
 }}
 """
-    meta_resp = client.models.generate_content(
-        model=CATEGORY_MODEL,
-        contents=[meta_prompt]
-    )
-    raw_text = meta_resp.text.strip()
-    log.debug(f"Case {case_id}: raw meta JSON text len={len(raw_text)}")
+    last_error: Optional[Exception] = None
+    for attempt in range(1, GEMINI_META_ATTEMPTS + 1):
+        meta_resp = gemini_generate(
+            model=CATEGORY_MODEL,
+            contents=[meta_prompt],
+            config=types.GenerateContentConfig(response_mime_type="application/json", http_options=_gemini_http_options())
+        )
+        raw_text = (meta_resp.text or "").strip()
+        log.debug(f"Case {case_id}: raw meta JSON text len={len(raw_text)} (attempt {attempt})")
+        try:
+            return validate_case_metadata(parse_metadata_json(raw_text))
+        except ValueError as e:  # json.JSONDecodeError is a ValueError
+            last_error = e
+            log.warning(f"Case {case_id}: metadata rejected on attempt {attempt}/{GEMINI_META_ATTEMPTS}: {e}")
+    raise RuntimeError(f"Metadata generation failed after {GEMINI_META_ATTEMPTS} attempts: {last_error}")
+
+def abandon_gemini(futures: Dict[str, Future], cancel: threading.Event) -> None:
+    """Give up on a build's Gemini calls: queued ones are cancelled, running ones stop retrying, and we wait out
+    the attempt in flight (bounded by GEMINI_TIMEOUT) so no call outlives the build and its case lease."""
+    cancel.set()
+    for f in futures.values():
+        f.cancel()
+    _, stuck = wait([f for f in futures.values() if not f.done()], timeout=GEMINI_TIMEOUT + 5)
+    if stuck:
+        log.warning(f"Gemini stages still running after the build gave up: {[n for n, f in futures.items() if f in stuck]}")
+
+def gather_gemini(futures: Dict[str, Future], timeout: float, cancel: threading.Event) -> Dict[str, Any]:
+    """Wait for all calls; on the first failure or timeout cancel whatever has not started yet.
+
+    Calls already in flight after a failure are given the rest of the deadline so their stage checkpoints land;
+    past the deadline they are abandoned (abandon_gemini).
+    """
+    deadline = time.monotonic() + timeout
+    done, pending = wait(list(futures.values()), timeout=timeout, return_when=FIRST_EXCEPTION)
+    failed = [f for f in done if f.exception() is not None]
+    if failed or pending:
+        for f in futures.values():
+            f.cancel()
+        if failed:
+            wait([f for f in futures.values() if not f.done()], timeout=max(0.0, deadline - time.monotonic()))
+        abandon_gemini(futures, cancel)
+        if failed:
+            raise failed[0].exception()
+        names = [n for n, f in futures.items() if f in pending]
+        raise TimeoutError(f"Gemini calls timed out after {timeout}s: {names}")
+    return {name: f.result() for name, f in futures.items()}
+
+# --- Staged generation: each stage checkpoints into cases/{id}/_build ---
+def build_ref(case_id: str):
+    return case_ref(case_id).child("_build")
+
+def checkpoint_stage(case_id: str, stage: str, value: Dict[str, Any]) -> Dict[str, Any]:
+    value = dict(value, completed_at=datetime.now(timezone.utc).isoformat())
+    build_ref(case_id).child(stage).set(value)
+    log.info(f"Case {case_id}: stage '{stage}' checkpointed")
+    return value
+
+def _run_stage(case_id: str, stage: str, cancel: Optional[threading.Event], fn, *args) -> Dict[str, Any]:
+    # Checkpoint from inside the worker so a finished stage survives a sibling's failure.
+    token = _gemini_cancel.set(cancel)
+    try:
+        with span(f"stage:{stage}"):
+            return checkpoint_stage(case_id, stage, fn(*args))
+    finally:
+        _gemini_cancel.reset(token)
+
+def plan_case(case_id: str) -> Dict[str, Any]:
+    # Ensure we have a cached pool ready
     try:
-        meta_json = json.loads(raw_text)
+        stats = ensure_minimum_ia_pool()
+        log.debug(f"Bootstrap stats for case {case_id}: {stats}")
     except Exception:
-        cleaned = raw_text
-        if "```" in raw_text:
-            parts = raw_text.split("```")
-            if len(parts) >= 2:
-                cleaned = parts[1]
-                if cleaned.lower().startswith("json"):
-                    cleaned = cleaned.split("\n", 1)[1]
-        meta_json = json.loads(cleaned)
-
-    case_brief = meta_json.get("case_brief", "A resurfaced portrait raises questions—its paper trail glitters a little too perfectly.")
-    metadata = meta_json.get("metadata", [])
-    ledger_summary = meta_json.get("ledger_summary", "")
-    solution = meta_json.get("solution", {})
-    answer_index = int(solution.get("answer_index", 0))
-    flags_signature = solution.get("flags_signature", [])
-    flags_metadata = solution.get("flags_metadata", [])
-    flags_financial = solution.get("flags_financial", [])
-    explanation = solution.get("explanation", "The authentic work aligns with period-accurate details; the others contain subtle contradictions.")
-    log.info(f"Case {case_id}: answer_index={answer_index}, meta_count={len(metadata)}")
+        log.exception("Bootstrap failed inside ensure_case_generated")
 
-    if len(metadata) != 3:
-        log.error("Gemini did not return exactly 3 metadata bundles")
-        raise RuntimeError("Expected exactly 3 metadata bundles.")
+    ia_item = choose_ia_item_for_case(case_id)
+    if not ia_item:
+        raise RuntimeError("No IA items available. Ingest needed.")
+
+    case_seed = seed_for_date(case_id)
+    mode = "knowledge" if (case_seed % 2 == 0) else "observation"
+    log.info(f"Case {case_id}: mode={mode}")
+    return {"mode": mode, "ia_item": ia_item}
+
+def generate_case(case_id: str, fresh: bool = False, lease_owner: Optional[str] = None) -> Dict[str, Any]:
+    """Run (or resume) the staged build: plan, authentic, forgery_N, metadata, tiles, then publish.
+
+    With `lease_owner` the publish only happens while that owner still holds the case lease."""
+    if fresh:
+        build_ref(case_id).delete()
+        build = {}
+    else:
+        build = build_ref(case_id).get() or {}
+        if build:
+            log.info(f"Case {case_id}: resuming build, completed stages={sorted(build.keys())}")
+
+    plan = build.get("plan") or _run_stage(case_id, "plan", None, plan_case, case_id)
+    mode, ia_item = plan["mode"], plan["ia_item"]
+    style_period = "sourced from Internet Archive; museum catalog reproduction"
+
+    forgery_stages = [f"forgery_{i+1}" for i in range(2)] if mode == "observation" else []
+    pending_forgeries = [st for st in forgery_stages if st not in build]
+
+    if "authentic" not in build and ia_item.get("storage_url") and ia_item.get("signature_crop_url") and ia_item.get("derivatives"):
+        # Already cached from IA: reference those blobs directly, no download/re-encode/upload.
+        build["authentic"] = checkpoint_stage(case_id, "authentic", {
+            "image_url": ia_item["storage_url"],
+            "crop_url": ia_item["signature_crop_url"],
+            "derivatives": ia_item["derivatives"],
+            "derivative_timings": ia_item.get("derivative_timings") or {},
+            "reused_ia_cache": True,
+        })
+
+    # Images decoded during this build, by (content-addressed) blob URL, so the tile stage never re-downloads them.
+    pixels: Dict[str, Image.Image] = {}
+    auth_img = None
+    if "authentic" not in build or pending_forgeries:
+        source_url = (build.get("authentic") or {}).get("image_url") or ia_item.get("storage_url") or ia_item["download_url"]
+        log.info(f"Case {case_id}: authentic source={source_url}")
+        with span("download_authentic", url=source_url):
+            auth_img = download_image_to_pil(source_url)
+        pixels[source_url] = auth_img
+
+    # Independent Gemini calls run concurrently on a bounded pool while we upload the authentic.
+    futures: Dict[str, Future] = {}
+    gemini_cancel = threading.Event()
+    if pending_forgeries:
+        input_part = gemini_input_part(auth_img)
+        for stage in pending_forgeries:
+            i = forgery_stages.index(stage)
+            futures[stage] = _gemini_executor.submit(in_trace_context(_run_stage), case_id, stage, gemini_cancel, generate_forgery, case_id, i, input_part, auth_img, pixels)
+    if "metadata" not in build:
+        futures["metadata"] = _gemini_executor.submit(in_trace_context(_run_stage), case_id, "metadata", gemini_cancel, generate_case_metadata, case_id, mode, ia_item)
+
+    try:
+        if "authentic" not in build:
+            with span("stage:authentic"):
+                url1 = save_image_return_url(auth_img)
+                pixels[url1] = auth_img
+                log.debug(f"Case {case_id}: saved authentic -> {url1}")
+                crop1 = crop_signature_macro(auth_img, 512)
+                crop1_url = save_image_return_url(crop1, quality=88)
+                log.debug(f"Case {case_id}: saved authentic crop -> {crop1_url}")
+                build["authentic"] = checkpoint_stage(case_id, "authentic", dict(
+                    build_derivatives(auth_img, f"{case_id}/authentic"), image_url=url1, crop_url=crop1_url))
+    except Exception:
+        abandon_gemini(futures, gemini_cancel)  # don't leave this build's calls running past its lease
+        raise
+
+    if futures:
+        t0 = time.monotonic()
+        with span("gather_gemini", stages=sorted(futures)):
+            build.update(gather_gemini(futures, timeout=GEMINI_BATCH_TIMEOUT, cancel=gemini_cancel))
+        log.info(f"Case {case_id}: {len(futures)} Gemini stages finished in {time.monotonic() - t0:.1f}s")
+
+    image_stages = ["authentic"] * 3 if mode == "knowledge" else ["authentic"] + forgery_stages
+    if "tiles" not in build:
+        with span("stage:tiles"):
+            build["tiles"] = checkpoint_stage(case_id, "tiles", {
+                st: ensure_tile_pyramid(build[st]["image_url"], pixels.get(build[st]["image_url"])) for st in dict.fromkeys(image_stages)
+            })
+    images_urls = [build[st]["image_url"] for st in image_stages]
+    signature_crops = [build[st]["crop_url"] for st in image_stages]
+    image_derivatives = [build[st].get("derivatives") or {} for st in image_stages]
+    image_tiles = [build["tiles"][st] for st in image_stages]
+
+    meta_json = metadata_from_checkpoint(build["metadata"])
+    solution = meta_json["solution"]
+    log.info(f"Case {case_id}: answer_index={solution['answer_index']}, meta_count={len(meta_json['metadata'])}")
 
     public = {
         "case_id": case_id,
         "mode": mode,
-        "brief": case_brief,
+        "brief": meta_json["case_brief"],
         "style_period": style_period,
         "images": images_urls,
         "signature_crops": signature_crops,
-        "metadata": metadata,
-        "ledger_summary": ledger_summary,
+        "image_derivatives": image_derivatives,
+        "image_tiles": image_tiles,  # deep-zoom manifests for the zoom modal
+        "metadata": meta_json["metadata"],
+        "ledger_summary": meta_json["ledger_summary"],
         "timer_seconds": TIMER_SECONDS,
         "initial_ip": INITIAL_IP,
         "tool_costs": TOOL_COSTS,
         "credits": {
             "source": "Internet Archive",
             "identifier": ia_item.get("identifier"),
-            "title": title,
-            "creator": creator,
-            "rights": rights,
-            "licenseurl": licenseurl
+            "title": ia_item.get("title") or "Untitled",
+            "creator": ia_item.get("creator") or "",
+            "rights": ia_item.get("rights") or "",
+            "licenseurl": ia_item.get("licenseurl") or ""
         }
     }
     solution_doc = {
-        "answer_index": answer_index,
-        "flags_signature": flags_signature,
-        "flags_metadata": flags_metadata,
-        "flags_financial": flags_financial,
-        "explanation": explanation
+        "answer_index": solution["answer_index"],
+        "flags_signature": solution["flags_signature"],
+        "flags_metadata": solution["flags_metadata"],
+        "flags_financial": solution["flags_financial"],
+        "explanation": solution["explanation"]
     }
 
-    cref = case_ref(case_id)
-    cref.child("public").set(public)
-    cref.child("solution").set(solution_doc)
+    if lease_owner and not renew_case_lease(case_id, lease_owner):
+        raise CaseLeaseLostError(f"Case {case_id}: lease lost during the build, not publishing")
+
+    # Publish: public + solution appear and the build scratch space disappears atomically.
+    batch = RTDBBatch()
+    batch.set(f"cases/{case_id}/public", public)
+    batch.set(f"cases/{case_id}/solution", solution_doc)
+    batch.set(f"cases/{case_id}/tiles", image_tiles)
+    batch.set(f"cases/{case_id}/build_stats", {
+        "derivatives": {st: build[st].get("derivative_timings") or {} for st in dict.fromkeys(image_stages)},
+    })
+    batch.set(f"cases/{case_id}/_build", None)
+    batch.commit()
+    invalidate_case_cache(case_id)
     log.info(f"Case {case_id}: generated and stored")
     return public
 
+# --- Pre-generation scheduler: build upcoming cases before any player asks ---
+class CasePregenerator:
+    """Keeps today's and the next `days` cases generated, retrying failures with backoff."""
+
+    def __init__(self, days: int = PREGEN_DAYS, interval: int = PREGEN_INTERVAL):
+        self.days = days
+        self.interval = interval
+        self._status: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def upcoming(self) -> List[str]:
+        return [case_id_for_offset(d) for d in range(0, self.days + 1)]
+
+    def _backoff(self, attempts: int) -> float:
+        return min(PREGEN_MAX_BACKOFF, 30 * (2 ** (attempts - 1))) * random.uniform(0.8, 1.2)
+
+    def run_once(self) -> Dict[str, Any]:
+        for case_id in self.upcoming():
+            with self._lock:
+                st = self._status.setdefault(case_id, {"state": "pending", "attempts": 0, "next_attempt_at": 0.0})
+                # "generating": another run_once (the loop or /admin/pregen/run) is already building this day.
+                if st["state"] in ("ready", "generating") or st["next_attempt_at"] > time.time():
+                    continue
+                st["state"] = "generating"
+            t0 = time.monotonic()
+            try:
+                public = ensure_case_generated(case_id)
+                with self._lock:
+                    st.update(state="ready", mode=public.get("mode"), last_error=None,
+                              ready_at=datetime.now(timezone.utc).isoformat(),
+                              elapsed_s=round(time.monotonic() - t0, 2))
+                log.info(f"Pregen: case {case_id} ready ({st['elapsed_s']}s)")
+            except CaseWarmingError:
+                with self._lock:
+                    st.update(state="warming", next_attempt_at=time.time() + CASE_WARMING_WAIT)
+            except Exception as e:
+                with self._lock:
+                    st["attempts"] += 1
+                    delay = self._backoff(st["attempts"])
+                    st.update(state="failed", last_error=str(e), next_attempt_at=time.time() + delay)
+                log.exception(f"Pregen: case {case_id} failed (attempt {st['attempts']}), retry in {delay:.0f}s")
+        with self._lock:
+            keep = set(self.upcoming())
+            for cid in [c for c in self._status if c not in keep]:
+                del self._status[cid]
+        return self.report()
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            cases = {cid: dict(st) for cid, st in self._status.items()}
+        for cid in self.upcoming():
+            st = cases.setdefault(cid, {"state": "unknown", "attempts": 0})
+            if st["state"] != "ready" and get_case_public(cid):
+                st["state"] = "ready"
+        return {
+            "days_ahead": self.days,
+            "interval": self.interval,
+            "running": bool(self._thread and self._thread.is_alive()),
+            "all_ready": all(st["state"] == "ready" for st in cases.values()),
+            "cases": cases,
+        }
+
+    def _loop(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception:
+                log.exception("Pregen run failed")
+            with self._lock:
+                pending = [st["next_attempt_at"] for st in self._status.values() if st["state"] != "ready"]
+            wake = min([self.interval] + [max(1.0, t - time.time()) for t in pending])
+            time.sleep(wake)
+
+    def start(self) -> Optional[threading.Thread]:
+        if self.interval <= 0 or (self._thread and self._thread.is_alive()):
+            return self._thread
+        self._thread = threading.Thread(target=self._loop, name="case-pregen", daemon=True)
+        self._thread.start()
+        log.info(f"Case pre-generation started (days_ahead={self.days}, interval={self.interval}s)")
+        return self._thread
+
+pregenerator = CasePregenerator()
+
 # -----------------------------------------------------------------------------
 # 5) SESSIONS, TOOLS, GUESS, LEADERBOARD
 # -----------------------------------------------------------------------------
@@ -701,12 +3007,30 @@ def create_session(user_id: str, username: str, case_id: str) -> Dict[str, Any]:
         "actions": [],
         "status": "active"
     }
-    sessions_ref().child(session_id).set(session_doc)
+    batch = RTDBBatch()
+    batch.set(f"sessions/{session_id}", session_doc)
+    batch.set(f"session_index/{case_id}/{fb_key(user_id)}", session_id)
+    batch.commit()
     log.info(f"New session {session_id} for user={username} case={case_id}")
     return session_doc
 
+def find_active_session(user_id: str, case_id: str) -> Optional[Dict[str, Any]]:
+    """Resume via the session_index/{case_id}/{user_id} pointer: two keyed reads, no scans."""
+    session_id = session_index_ref(case_id).child(fb_key(user_id)).get()
+    if not session_id:
+        return None
+    sess = sessions_ref().child(session_id).get() or {}
+    if sess.get("case_id") == case_id and sess.get("status") == "active":
+        return sess
+    return None
+
 def get_session(session_id: str) -> Dict[str, Any]:
-    return sessions_ref().child(session_id).get() or {}
+    """Read a session together with its RTDB etag (kept under `_etag`, never persisted)."""
+    sess, etag = sessions_ref().child(session_id).get(etag=True)
+    if not sess:
+        return {}
+    sess["_etag"] = etag
+    return sess
 
 def require_active_session(req) -> Tuple[Dict[str, Any], Dict[str, Any]]:
     session_id = req.headers.get("X-Session-Id", "")
@@ -723,16 +3047,96 @@ def require_active_session(req) -> Tuple[Dict[str, Any], Dict[str, Any]]:
         return {}, {"error": "Session expired."}
     return sess, {}
 
+# --- Session mutations: one round trip per request ---
+class RTDBBatch:
+    """Collects path -> value writes and commits them as a single atomic multi-path update."""
+
+    def __init__(self):
+        self.updates: Dict[str, Any] = {}
+        self._after_commit: List[Any] = []
+
+    def after_commit(self, fn) -> None:
+        self._after_commit.append(fn)
+
+    def set(self, path: str, value: Any) -> None:
+        self.updates[path.strip("/")] = value
+
+    def update(self, path: str, values: Dict[str, Any]) -> None:
+        for k, v in values.items():
+            self.set(f"{path.strip('/')}/{k}", v)
+
+    def commit(self) -> None:
+        if not self.updates:
+            return
+        log.debug(f"RTDB multi-path update: {len(self.updates)} paths")
+        db_root.update(self.updates)
+        self.updates = {}
+        for fn in self._after_commit:
+            fn()
+        self._after_commit = []
+
+def _action_key() -> str:
+    # Chronologically sortable like RTDB push ids, but generated locally (no extra round trip).
+    return f"{int(time.time() * 1000):013d}-{uuid.uuid4().hex[:8]}"
+
+SPEND_IP_MAX_ATTEMPTS = 5
+
 def spend_ip(session: Dict[str, Any], cost: int, action: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
-    if session["ip_remaining"] < cost:
-        return session, {"error": "Not enough Investigation Points."}
-    new_ip = session["ip_remaining"] - cost
-    session["ip_remaining"] = new_ip
+    """Atomically deduct IP and append the action with one conditional (etag) write.
+
+    Concurrent tool calls on the same session race on the etag; the loser re-checks
+    the fresh snapshot, so the same IP can never be spent twice.
+    """
     action["ts"] = datetime.now(timezone.utc).isoformat()
-    sessions_ref().child(session["session_id"]).child("ip_remaining").set(new_ip)
-    sessions_ref().child(session["session_id"]).child("actions").push(action)
-    log.debug(f"Spend IP: {cost} -> remaining={new_ip}")
-    return session, {}
+    sref = sessions_ref().child(session["session_id"])
+    etag = session.get("_etag")
+    current = {k: v for k, v in session.items() if k != "_etag"}
+    for _ in range(SPEND_IP_MAX_ATTEMPTS):
+        if current.get("status") != "active":
+            return session, {"error": "Invalid or inactive session."}
+        if (current.get("ip_remaining") or 0) < cost:
+            return session, {"error": "Not enough Investigation Points."}
+        actions = current.get("actions") or {}
+        if isinstance(actions, list):
+            actions = {str(i): a for i, a in enumerate(actions) if a}
+        new_doc = dict(current, ip_remaining=current["ip_remaining"] - cost, actions={**actions, _action_key(): action})
+        if etag is None:
+            current, etag = sref.get(etag=True)
+            current = current or {}
+            continue
+        ok, snapshot, etag = sref.set_if_unchanged(etag, new_doc)
+        if ok:
+            session.update(new_doc, _etag=etag)
+            log.debug(f"Spend IP: {cost} -> remaining={new_doc['ip_remaining']}")
+            return session, {}
+        log.debug(f"Spend IP: etag conflict on session {session['session_id']}, retrying")
+        current = snapshot or {}
+    return session, {"error": "Session busy, please retry."}
+
+def finish_session(session: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Flip status active -> finished with a conditional (etag) write.
+
+    Of concurrent or retried guesses on one session exactly one wins; only that one may record
+    the play, so the score histogram is bumped once per session.
+    """
+    sref = sessions_ref().child(session["session_id"])
+    etag = session.get("_etag")
+    current = {k: v for k, v in session.items() if k != "_etag"}
+    for _ in range(SPEND_IP_MAX_ATTEMPTS):
+        if current.get("status") != "active":
+            return session, {"error": "Guess already submitted for this session."}
+        if etag is None:
+            current, etag = sref.get(etag=True)
+            current = current or {}
+            continue
+        new_doc = dict(current, status="finished")
+        ok, snapshot, etag = sref.set_if_unchanged(etag, new_doc)
+        if ok:
+            session.update(new_doc, _etag=etag)
+            return session, {}
+        log.debug(f"Finish session: etag conflict on session {session['session_id']}, retrying")
+        current = snapshot or {}
+    return session, {"error": "Session busy, please retry."}
 
 def score_result(correct: bool, session: Dict[str, Any]) -> Dict[str, Any]:
     exp = datetime.fromisoformat(session["expires_at"].replace("Z", "+00:00"))
@@ -745,80 +3149,405 @@ def score_result(correct: bool, session: Dict[str, Any]) -> Dict[str, Any]:
     score = max(0, base + time_bonus + ip_bonus - penalty)
     return {"score": score, "seconds_left": seconds_left, "ip_left": session["ip_remaining"]}
 
-def upsert_leaderboard(case_id: str, user_id: str, username: str, score: int):
-    plays_ref(case_id).child(user_id).set({
-        "user_id": user_id,
-        "username": username,
-        "score": score,
-        "ts": datetime.now(timezone.utc).isoformat()
-    })
-    plays = plays_ref(case_id).get() or {}
-    top = sorted(plays.values(), key=lambda x: x.get("score", 0), reverse=True)[:LEADERBOARD_TOP_N]
-    leaderboard_ref(case_id).set(top)
+# --- Leaderboard: sorted top-N, merged under the node's etag so concurrent guesses never lose a row ---
+_leaderboard_cache = TTLCache("leaderboard_top", CASE_CACHE_MAX, LEADERBOARD_CACHE_TTL, shared=True)
+LEADERBOARD_MAX_ATTEMPTS = 8
+
+def _lb_sort_key(row: Dict[str, Any]) -> Tuple[int, str]:
+    return (-int(row.get("score") or 0), row.get("ts") or "")
+
+def _lb_rows(raw: Any) -> List[Dict[str, Any]]:
+    # RTDB returns a list, or a dict when indices are sparse; duplicates left by older writers are dropped.
+    rows = raw.values() if isinstance(raw, dict) else (raw or [])
+    out, seen = [], set()
+    for r in sorted((r for r in rows if r), key=_lb_sort_key):
+        if r.get("user_id") not in seen:
+            seen.add(r.get("user_id"))
+            out.append(r)
+    return out
+
+def load_leaderboard_top(case_id: str) -> List[Dict[str, Any]]:
+    top = _leaderboard_cache.get(case_id)
+    if top is None:
+        top = _lb_rows(leaderboard_ref(case_id).get())
+        _leaderboard_cache.put(case_id, top)
+    return top
+
+def _refill_leaderboard_slot(case_id: str, top: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    # Only needed when a player on a full board drops out; reads N+1 rows via the score index.
+    in_top = {r.get("user_id") for r in top}
+    rows = plays_ref(case_id).order_by_child("score").limit_to_last(LEADERBOARD_TOP_N + 1).get() or {}
+    rest = sorted((r for r in rows.values() if r.get("user_id") not in in_top), key=_lb_sort_key)
+    return rest[0] if rest else None
+
+def _merge_leaderboard_row(case_id: str, old: List[Dict[str, Any]], row: Dict[str, Any]) -> List[Dict[str, Any]]:
+    top = [r for r in old if r.get("user_id") != row["user_id"]]
+    dropped_out = len(top) < len(old)
+    pos = bisect.bisect_right([_lb_sort_key(r) for r in top], _lb_sort_key(row))
+    if dropped_out and len(old) >= LEADERBOARD_TOP_N and pos >= len(top):
+        # The player fell to the last slot of a full board: someone outside may now outrank them.
+        refill = _refill_leaderboard_slot(case_id, top + [row])
+        if refill and _lb_sort_key(refill) < _lb_sort_key(row):
+            row = {k: refill.get(k) for k in ("user_id", "username", "score", "ts")}
+        top.append(row)
+    elif pos < LEADERBOARD_TOP_N:
+        top.insert(pos, row)
+    return top[:LEADERBOARD_TOP_N]
+
+def merge_leaderboard_top(case_id: str, row: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """Read-merge-write of leaderboards/{id}/top guarded by its etag; a conflicting writer makes us
+    re-merge into the list it just wrote. Runs after the play is committed, so refills can see it."""
+    ref = leaderboard_ref(case_id)
+    current, etag = ref.get(etag=True)
+    for _ in range(LEADERBOARD_MAX_ATTEMPTS):
+        old = _lb_rows(current)
+        top = _merge_leaderboard_row(case_id, old, row)
+        if top == old and isinstance(current, list) and len(current) == len(old):
+            ok = True
+        else:
+            ok, current, etag = ref.set_if_unchanged(etag, top)
+        if ok:
+            _leaderboard_cache.put(case_id, top)
+            return top
+        log.debug(f"Leaderboard {case_id}: etag conflict, re-merging")
+    log.warning(f"Leaderboard {case_id}: gave up merging {row['user_id']} after {LEADERBOARD_MAX_ATTEMPTS} attempts")
+    _leaderboard_cache.invalidate(case_id)
+    return None
+
+def _merge_leaderboard_after_commit(case_id: str, row: Dict[str, Any]) -> None:
+    try:
+        merge_leaderboard_top(case_id, row)
+    except Exception:
+        # The play itself is stored; the board is re-merged from the node on the next guess.
+        _leaderboard_cache.invalidate(case_id)
+        log.exception(f"Leaderboard {case_id}: merge failed for {row['user_id']}")
+
+def upsert_leaderboard(batch: RTDBBatch, case_id: str, play: Dict[str, Any]):
+    """Stage the play record and histogram bump; the top-N merge runs once they are committed."""
+    row = {k: play[k] for k in ("user_id", "username", "score", "ts")}
+
+    prev_score = plays_ref(case_id).child(play["user_id"]).child("score").get()
+    stage_score_hist(batch, case_id, prev_score, play["score"])
+
+    batch.set(f"plays/{case_id}/{play['user_id']}", play)
+    batch.after_commit(lambda: _merge_leaderboard_after_commit(case_id, row))
+
+# --- Score histogram: exact rank/percentile for every player in O(buckets) ---
+_score_hist_cache = TTLCache("score_hist", CASE_CACHE_MAX, LEADERBOARD_CACHE_TTL)
+
+def _hist_bucket(score: int) -> str:
+    # Prefixed so RTDB never coerces the integer-keyed node into an array.
+    return f"s{int(score)}"
+
+def _sv_increment(n: int) -> Dict[str, Any]:
+    return {".sv": {"increment": n}}
+
+def stage_score_hist(batch: RTDBBatch, case_id: str, prev_score: Optional[int], score: int):
+    base = f"leaderboards/{case_id}/hist"
+    if prev_score is None:
+        batch.set(f"{base}/{_hist_bucket(score)}", _sv_increment(1))
+    elif int(prev_score) != int(score):
+        batch.set(f"{base}/{_hist_bucket(prev_score)}", _sv_increment(-1))
+        batch.set(f"{base}/{_hist_bucket(score)}", _sv_increment(1))
+    batch.after_commit(lambda: _score_hist_cache.invalidate(case_id))
+
+def load_score_hist(case_id: str) -> Dict[int, int]:
+    hist = _score_hist_cache.get(case_id)
+    if hist is None:
+        raw = score_hist_ref(case_id).get() or {}
+        hist = {int(k[1:]): int(v) for k, v in raw.items() if k.startswith("s") and v}
+        _score_hist_cache.put(case_id, hist)
+    return hist
+
+def rank_from_hist(hist: Dict[int, int], score: int) -> Dict[str, Any]:
+    """Rank is 1 + players with a strictly higher score (ties share it, as in ranked_top_rows)."""
+    total = sum(hist.values())
+    if not total:
+        return {"rank": None, "percentile": None, "players": 0}
+    if total == 1:
+        return {"rank": 1, "percentile": 100.0, "players": 1}
+    better = sum(c for s, c in hist.items() if s > score)
+    equal = hist.get(score, 0)
+    percentile = 100.0 * (total - better - equal + 0.5 * equal) / total
+    return {"rank": better + 1, "percentile": round(percentile, 1), "players": total}
+
+def ranked_top_rows(top: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """The top list with competition ranks: tied scores share a rank, the next one skips (1, 2, 2, 4)."""
+    out, rank, prev = [], 0, None
+    for i, row in enumerate(top):
+        score = int(row.get("score") or 0)
+        if score != prev:
+            rank, prev = i + 1, score
+        out.append(dict(row, rank=rank))
+    return out
+
+# --- Session sweeper: archive past-case sessions to Storage, drop them from RTDB ---
+def sweep_expired_sessions(max_sessions: int = SESSION_SWEEP_BATCH) -> Dict[str, Any]:
+    t0 = time.monotonic()
+    now = datetime.now(timezone.utc)
+    yesterday = (now - timedelta(days=1)).strftime("%Y%m%d")
+    # case_id is YYYYMMDD, so end_at(yesterday) selects sessions of every past case.
+    rows = sessions_ref().order_by_child("case_id").end_at(yesterday).limit_to_first(max_sessions).get() or {}
+
+    by_case: Dict[str, List[Dict[str, Any]]] = {}
+    for sid, sdoc in rows.items():
+        exp = sdoc.get("expires_at")
+        if sdoc.get("status") == "active" and exp and datetime.fromisoformat(exp.replace("Z", "+00:00")) > now:
+            continue
+        by_case.setdefault(sdoc.get("case_id") or "unknown", []).append(sdoc)
+
+    archived, raw_bytes, archive_bytes, archives = 0, 0, 0, []
+    stamp = now.strftime("%Y%m%dT%H%M%S")
+    for case_id, docs in sorted(by_case.items()):
+        docs.sort(key=lambda d: d.get("started_at") or "")
+        lines = [json.dumps(d, separators=(",", ":"), sort_keys=True) for d in docs]
+        raw = ("\n".join(lines) + "\n").encode("utf-8")
+        blob = gzip.compress(raw, compresslevel=9)
+        path = f"archive/sessions/{case_id}/{stamp}-{uuid.uuid4().hex[:6]}.jsonl.gz"
+        url = upload_bytes_to_storage(blob, path, "application/gzip")
+
+        batch = RTDBBatch()
+        for d in docs:
+            batch.set(f"sessions/{d['session_id']}", None)
+        batch.set(f"session_index/{case_id}", None)
+        batch.commit()
+
+        archived += len(docs)
+        raw_bytes += len(raw)
+        archive_bytes += len(blob)
+        archives.append({"case_id": case_id, "sessions": len(docs), "url": url})
+        log.info(f"Archived {len(docs)} sessions of case {case_id} -> {path} ({len(raw)}B -> {len(blob)}B)")
+
+    elapsed = time.monotonic() - t0
+    stats = {
+        "ok": True,
+        "scanned": len(rows),
+        "archived": archived,
+        "bytes_reclaimed": raw_bytes,
+        "archive_bytes": archive_bytes,
+        "elapsed_s": round(elapsed, 3),
+        "sessions_per_s": round(archived / elapsed, 1) if elapsed > 0 else None,
+        "more": len(rows) >= max_sessions,
+        "archives": archives,
+    }
+    log.info(f"sweep_expired_sessions: archived={archived} reclaimed={raw_bytes}B in {elapsed:.2f}s")
+    return stats
+
+def _session_sweeper_loop(interval: int):
+    while True:
+        try:
+            stats = sweep_expired_sessions()
+            while stats.get("more") and stats.get("archived"):
+                stats = sweep_expired_sessions()
+        except Exception:
+            log.exception("Session sweeper run failed")
+        time.sleep(interval)
+
+def start_session_sweeper(interval: int = SESSION_SWEEP_INTERVAL) -> Optional[threading.Thread]:
+    if interval <= 0:
+        return None
+    t = threading.Thread(target=_session_sweeper_loop, args=(interval,), name="session-sweeper", daemon=True)
+    t.start()
+    log.info(f"Session sweeper started (every {interval}s, batch={SESSION_SWEEP_BATCH})")
+    return t
+
+# --- Warm-up: start-up work that used to block app.run() ---
+_warmup: Dict[str, Any] = {"state": "pending"}
+_warmup_lock = threading.Lock()
+
+def warmup_status() -> Dict[str, Any]:
+    with _warmup_lock:
+        return dict(_warmup)
+
+def _set_warmup(**fields) -> None:
+    with _warmup_lock:
+        _warmup.update(fields)
+
+# --- Serving: one leader per host, library preload before fork ---
+_leader_pid: Optional[int] = None
+
+def acquire_leader_lock() -> bool:
+    """Non-blocking flock on SERVE_LEADER_LOCK; held until this process exits, so a restarted worker can take over."""
+    global _leader_pid
+    if _leader_pid == os.getpid() or not SERVE_LEADER_LOCK:
+        return True
+    try:
+        import fcntl
+    except ImportError:  # no flock (Windows dev server): single process anyway
+        return True
+    fd = os.open(SERVE_LEADER_LOCK, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return False
+    os.ftruncate(fd, 0)
+    os.write(fd, f"{WORKER_ID}\n".encode())
+    _leader_pid = os.getpid()  # the fd stays open on purpose: closing it releases the lock
+    return True
+
+def preload_libraries() -> None:
+    """Import (but do not construct) the Firebase/Gemini clients in the pre-fork master, so workers share the pages."""
+    t0 = time.monotonic()
+    for mod in ("firebase_admin", "firebase_admin.credentials", "firebase_admin.db", "firebase_admin.storage",
+                "google.genai", "google.genai.types"):
+        importlib.import_module(mod)
+    log.info(f"Client libraries preloaded in {time.monotonic() - t0:.2f}s")
+
+def on_worker_fork() -> None:
+    """Per-worker start after a pre-fork (gunicorn post_fork): own identity and RNG, then warm-up."""
+    global WORKER_ID, _trace_file_per_process
+    WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+    _trace_file_per_process = True
+    random.seed()
+    start_metrics_flusher()
+    start_warmup()
+
+def warm_up(bootstrap: bool = True) -> None:
+    """Build the clients, top up the IA pool, then start the periodic loops (which need both)."""
+    t0 = time.monotonic()
+    _set_warmup(state="clients", started_at=datetime.now(timezone.utc).isoformat())
+    try:
+        for lazy in (db_root, bucket, client, types):
+            lazy.get()
+    except Exception as e:
+        _set_warmup(state="failed", error=str(e))
+        return
+
+    # Bootstrap and the loops run in one worker per host; the rest serve requests and retry the lock.
+    if not acquire_leader_lock():
+        _set_warmup(state="standby", leader=False, elapsed_s=round(time.monotonic() - t0, 2))
+        log.info(f"Warm-up: clients ready, another worker leads (retrying every {SERVE_LEADER_RETRY}s)")
+        while not acquire_leader_lock():
+            time.sleep(SERVE_LEADER_RETRY)
+        log.info("Warm-up: took over as leader")
+    _set_warmup(leader=True)
+
+    if bootstrap:
+        _set_warmup(state="bootstrap")
+        log.info("Bootstrapping Internet Archive pool...")
+        try:
+            stats = ensure_minimum_ia_pool()
+            _set_warmup(bootstrap=stats)
+            log.info(f"Bootstrap complete: {stats}")
+        except Exception as e:
+            _set_warmup(bootstrap={"ok": False, "error": str(e)})
+            log.exception("Bootstrap failed")
+
+    start_session_sweeper()
+    pregenerator.start()
+    job_runner.start()
+    _set_warmup(state="done", elapsed_s=round(time.monotonic() - t0, 2),
+                finished_at=datetime.now(timezone.utc).isoformat())
+    log.info(f"Warm-up finished in {time.monotonic() - t0:.1f}s")
+
+def start_warmup() -> threading.Thread:
+    t = threading.Thread(target=warm_up, args=(os.environ.get("BOOTSTRAP_IA", "1") == "1",), name="warm-up", daemon=True)
+    t.start()
+    return t
 
 # -----------------------------------------------------------------------------
 # 6) ROUTES
 # -----------------------------------------------------------------------------
+@app.before_request
+def _request_start():
+    g.metrics_t0 = time.perf_counter()
+    if TRACE_SAMPLE_RATE > 0 and random.random() < TRACE_SAMPLE_RATE:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        g.trace = start_trace(f"{request.method} {route}", "request", path=request.path)
+
+@app.after_request
+def _request_end(resp):
+    t0 = g.pop("metrics_t0", None)
+    if t0 is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        _route_latency.observe(time.perf_counter() - t0, route, request.method, resp.status_code)
+    if "trace" in g:
+        g.trace[0].attrs["status"] = resp.status_code
+    return resp
+
+@app.teardown_request
+def _trace_finish(exc):
+    traced = g.pop("trace", None)
+    if traced is not None:
+        if exc is not None:
+            traced[0].error = f"{exc.__class__.__name__}: {exc}"[:300]
+        end_trace(*traced)
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    # Prometheus text format; per-process series, summed across workers when the shared cache is on.
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
 @app.route("/health", methods=["GET"])
 def health():
+    # Liveness only: never touches Firebase/Gemini, answers as soon as the port is open.
     return jsonify({"ok": True, "time": datetime.now(timezone.utc).isoformat()})
 
+@app.route("/health/ready", methods=["GET"])
+def health_ready():
+    checks = {}
+    for name, lazy in (("firebase_db", db_root), ("firebase_storage", bucket), ("gemini", client)):
+        try:
+            lazy.get()
+            checks[name] = "ok"
+        except Exception as e:
+            checks[name] = f"error: {e}"
+    ready = all(v == "ok" for v in checks.values())
+    return jsonify({"ready": ready, "checks": checks, "warmup": warmup_status()}), (200 if ready else 503)
+
 # --- Admin: Internet Archive ingestion (manual) ---
+def _job_response(kind: str, params: Dict[str, Any]):
+    """Queue `kind` and return 202 + job id; {"sync": true} runs it inline and returns its result."""
+    if params.pop("sync", False):
+        doc = job_runner.run_sync(kind, params)
+        if doc.get("status") != "done":
+            return jsonify({"ok": False, "job_id": doc.get("id"), "error": doc.get("error")}), 500
+        return jsonify(doc.get("result") or {})
+    job_id = job_runner.submit(kind, params)
+    return jsonify({"ok": True, "job_id": job_id, "status_url": f"/admin/jobs/{job_id}"}), 202
+
 @app.route("/admin/ingest-ia", methods=["POST"])
 def admin_ingest_ia():
     if not ADMIN_KEY or request.headers.get("X-Admin-Key") != ADMIN_KEY:
         return jsonify({"error": "Forbidden"}), 403
-
-    body = request.get_json() or {}
-    query = body.get("query") or DEFAULT_IA_QUERY
-    pages = int(body.get("pages") or 2)
-    rows = int(body.get("rows") or 100)
-    ingested = 0
-    errors = 0
-    log.info(f"Manual ingest: query='{query}' pages={pages} rows={rows}")
-
-    for page in range(1, pages + 1):
-        try:
-            docs = ia_advanced_search(query, rows=rows, page=page)
-        except Exception:
-            errors += 1
-            continue
-        for d in docs:
-            ident = d.get("identifier")
-            if not ident:
-                continue
-            if ia_pool_ref().child(fb_key(ident)).get():
-                continue
-            try:
-                rec = ingest_ia_doc(d)
-                if rec:
-                    ingested += 1
-            except Exception:
-                errors += 1
-                log.exception(f"Manual ingest failed for {ident}")
-                continue
-
-    pool_size = len(ia_pool_ref().get() or {})
-    return jsonify({"ok": True, "ingested": ingested, "errors": errors, "pool_size": pool_size})
+    return _job_response("ingest_ia", request.get_json(silent=True) or {})
 
 # --- Admin: Cache IA images to Firebase Storage (manual) ---
 @app.route("/admin/cache-ia", methods=["POST"])
 def admin_cache_ia():
     if not ADMIN_KEY or request.headers.get("X-Admin-Key") != ADMIN_KEY:
         return jsonify({"error": "Forbidden"}), 403
+    return _job_response("cache_ia", request.get_json(silent=True) or {})
 
-    cfg = request.get_json() or {}
-    out = batch_cache_ia_pool(
-        limit=int(cfg.get("limit", 100)),
-        overwrite=bool(cfg.get("overwrite", False)),
-        randomize=bool(cfg.get("randomize", True)),
-        min_width=int(cfg.get("min_width", 800)),
-        min_height=int(cfg.get("min_height", 800)),
-        max_dim=int(cfg.get("max_dim", 4096)),
-        jpeg_quality=int(cfg.get("jpeg_quality", 90)),
-        skip_if_restricted=bool(cfg.get("skip_if_restricted", True)),
-    )
-    return jsonify(out)
+# --- Admin: background job status ---
+@app.route("/admin/jobs", methods=["GET"])
+def admin_jobs_list():
+    if not ADMIN_KEY or request.headers.get("X-Admin-Key") != ADMIN_KEY:
+        return jsonify({"error": "Forbidden"}), 403
+    limit = max(1, min(100, int(request.args.get("limit", 20))))
+    jobs = admin_jobs_ref().order_by_key().limit_to_last(limit).get() or {}
+    listed = [{k: v for k, v in doc.items() if k not in ("results", "checkpoint")} for doc in jobs.values()]
+    return jsonify({"jobs": sorted(listed, key=lambda d: d.get("id", ""), reverse=True)})
+
+@app.route("/admin/jobs/<job_id>", methods=["GET"])
+def admin_job_status(job_id):
+    if not ADMIN_KEY or request.headers.get("X-Admin-Key") != ADMIN_KEY:
+        return jsonify({"error": "Forbidden"}), 403
+    doc = admin_jobs_ref().child(fb_key(job_id)).get()
+    if not doc:
+        return jsonify({"error": "Job not found"}), 404
+    doc.pop("checkpoint", None)
+    return jsonify(doc)
+
+# --- Admin: slow traces recorded by this process ---
+@app.route("/admin/traces", methods=["GET"])
+def admin_traces():
+    if not ADMIN_KEY or request.headers.get("X-Admin-Key") != ADMIN_KEY:
+        return jsonify({"error": "Forbidden"}), 403
+    limit = max(1, min(50, int(request.args.get("limit", "20"))))
+    return jsonify({"worker": WORKER_ID, "sample_rate": TRACE_SAMPLE_RATE, "slow_ms": TRACE_SLOW_MS,
+                    "traces": recent_traces(limit)})
 
 # --- Admin: pool stats ---
 @app.route("/admin/ia-pool/stats", methods=["GET"])
@@ -827,43 +3556,82 @@ def ia_pool_stats():
         return jsonify({"error": "Forbidden"}), 403
     pool = ia_pool_ref().get() or {}
     cached = sum(1 for r in pool.values() if r.get("storage_url"))
-    return jsonify({"pool_size": len(pool), "cached": cached})
+    duplicates = sum(1 for r in pool.values() if r.get("duplicate_of"))
+    rejected = sum(1 for r in pool.values() if r.get("rejected"))
+    return jsonify({"pool_size": len(pool), "cached": cached, "near_duplicates": duplicates, "rejected": rejected})
 
 # --- Admin: pre-generate today's case (manual) ---
 @app.route("/admin/generate-today", methods=["POST"])
 def admin_generate_today():
     if not ADMIN_KEY or request.headers.get("X-Admin-Key") != ADMIN_KEY:
         return jsonify({"error": "Forbidden"}), 403
+    body = request.get_json(silent=True) or {}
     case_id = utc_today_str()
-    public = ensure_case_generated(case_id)
+    try:
+        public = ensure_case_generated(case_id, force=bool(body.get("force", False)))
+    except CaseWarmingError as e:
+        return jsonify({"generated": False, "case_id": case_id, "error": str(e)}), 409
     return jsonify({"generated": True, "case_id": case_id, "mode": public.get("mode")})
 
+# --- Admin: upcoming-case readiness / trigger a pre-generation pass ---
+@app.route("/admin/pregen/status", methods=["GET"])
+def admin_pregen_status():
+    if not ADMIN_KEY or request.headers.get("X-Admin-Key") != ADMIN_KEY:
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(pregenerator.report())
+
+@app.route("/admin/pregen/run", methods=["POST"])
+def admin_pregen_run():
+    if not ADMIN_KEY or request.headers.get("X-Admin-Key") != ADMIN_KEY:
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify(pregenerator.run_once())
+
+# --- Admin: outbound HTTP latency per endpoint ---
+@app.route("/admin/http/stats", methods=["GET"])
+def admin_http_stats():
+    if not ADMIN_KEY or request.headers.get("X-Admin-Key") != ADMIN_KEY:
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify({
+        "pool_size": HTTP_POOL_SIZE,
+        "max_retries": HTTP_MAX_RETRIES,
+        "endpoints": http_stats(),
+        "disk_cache": _disk_cache.stats() if _disk_cache else None,
+    })
+
+# --- Admin: in-process case cache stats / invalidation ---
+@app.route("/admin/cache/stats", methods=["GET"])
+def admin_cache_stats():
+    if not ADMIN_KEY or request.headers.get("X-Admin-Key") != ADMIN_KEY:
+        return jsonify({"error": "Forbidden"}), 403
+    return jsonify({"caches": [c.stats() for c in TTLCache.instances], "blobs": blob_stats(),
+                    "shared": _shared_cache.stats() if _shared_cache else None})
+
+@app.route("/admin/cache/invalidate", methods=["POST"])
+def admin_cache_invalidate():
+    if not ADMIN_KEY or request.headers.get("X-Admin-Key") != ADMIN_KEY:
+        return jsonify({"error": "Forbidden"}), 403
+    body = request.get_json(silent=True) or {}
+    case_id = body.get("case_id") or utc_today_str()
+    invalidate_case_cache(case_id)
+    return jsonify({"ok": True, "case_id": case_id})
+
+# --- Admin: archive and delete sessions of past cases ---
+@app.route("/admin/sweep-sessions", methods=["POST"])
+def admin_sweep_sessions():
+    if not ADMIN_KEY or request.headers.get("X-Admin-Key") != ADMIN_KEY:
+        return jsonify({"error": "Forbidden"}), 403
+    cfg = request.get_json(silent=True) or {}
+    return jsonify(sweep_expired_sessions(max_sessions=int(cfg.get("max_sessions", SESSION_SWEEP_BATCH))))
+
 # --- DEV-ONLY: panic button bootstrap (no auth; gated by env) ---
 @app.route("/admin/bootstrap-now", methods=["POST"])
 def admin_bootstrap_now():
     if not ALLOW_DEV_BOOTSTRAP:
         return jsonify({"error": "Disabled. Set ALLOW_DEV_BOOTSTRAP=1 to enable."}), 403
-
-    cfg = request.get_json() or {}
-    min_items = int(cfg.get("min_items", MIN_IA_POOL))
-    rows = int(cfg.get("rows", 100))
-    max_pages = int(cfg.get("max_pages", 5))
-    custom_q = cfg.get("query")
-
-    global DEFAULT_IA_QUERY
-    original_q = DEFAULT_IA_QUERY
-    if custom_q:
-        log.warning(f"DEV bootstrap using custom query: {custom_q!r}")
-        DEFAULT_IA_QUERY = custom_q  # temporary override
-
-    try:
-        stats = ensure_minimum_ia_pool(min_items=min_items, rows=rows, max_pages=max_pages)
-        return jsonify({"ok": True, "stats": stats, "effective_query": DEFAULT_IA_QUERY})
-    except Exception as e:
-        log.exception("bootstrap-now failed")
-        return jsonify({"ok": False, "error": str(e)}), 500
-    finally:
-        DEFAULT_IA_QUERY = original_q  # restore
+    cfg = request.get_json(silent=True) or {}
+    if cfg.get("query"):
+        log.warning(f"DEV bootstrap using custom query: {cfg['query']!r}")
+    return _job_response("bootstrap", cfg)
 
 # --- DEV-ONLY: diagnostics (network + firebase sanity) ---
 @app.route("/admin/diagnostics", methods=["GET"])
@@ -902,15 +3670,14 @@ def diagnostics():
 def start_case():
     user_id, username = extract_user_from_headers(request)
     case_id = utc_today_str()
-    public = ensure_case_generated(case_id)
-
-    existing = sessions_ref().order_by_child("user_id").equal_to(user_id).get()
-    sess = None
-    if existing:
-        for _, sdoc in existing.items():
-            if sdoc.get("case_id") == case_id and sdoc.get("status") == "active":
-                sess = sdoc
-                break
+    try:
+        public = ensure_case_generated(case_id)
+    except CaseWarmingError as e:
+        resp = jsonify({"error": "Case warming", "case_id": case_id, "retry_after": e.retry_after})
+        resp.headers["Retry-After"] = str(e.retry_after)
+        return resp, 503
+
+    sess = find_active_session(user_id, case_id)
     if not sess:
         sess = create_session(user_id, username, case_id)
 
@@ -931,11 +3698,17 @@ def tool_signature(case_id):
     session, err = spend_ip(session, TOOL_COSTS["signature"], {"type": "tool_signature", "image_index": img_index})
     if err: return jsonify(err), 400
 
-    public = case_ref(case_id).child("public").get() or {}
+    public = get_case_public(case_id)
     crops = public.get("signature_crops", [])
     crop_url = crops[img_index] if img_index < len(crops) else ""
+    tiles = get_case_tiles(case_id)
     hint = "Examine baseline alignment and stroke overlap." if public.get("mode") == "observation" else ""
-    return jsonify({"crop_url": crop_url, "hint": hint, "ip_remaining": session["ip_remaining"]})
+    return jsonify({
+        "crop_url": crop_url,
+        "tiles": tiles[img_index] if img_index < len(tiles) else None,
+        "hint": hint,
+        "ip_remaining": session["ip_remaining"],
+    })
 
 @app.route("/cases/<case_id>/tool/metadata", methods=["POST"])
 def tool_metadata(case_id):
@@ -952,7 +3725,7 @@ def tool_metadata(case_id):
     session, err = spend_ip(session, TOOL_COSTS["metadata"], {"type": "tool_metadata", "image_index": img_index})
     if err: return jsonify(err), 400
 
-    solution = case_ref(case_id).child("solution").get() or {}
+    solution = get_case_solution(case_id)
     flags_metadata: List[str] = solution.get("flags_metadata", [])
     hint = flags_metadata[0] if flags_metadata else "Check chronology, chemistry, and institutional formats."
     return jsonify({"flags": [hint], "ip_remaining": session["ip_remaining"]})
@@ -967,7 +3740,7 @@ def tool_financial(case_id):
     session, err = spend_ip(session, TOOL_COSTS["financial"], {"type": "tool_financial"})
     if err: return jsonify(err), 400
 
-    solution = case_ref(case_id).child("solution").get() or {}
+    solution = get_case_solution(case_id)
     flags_financial: List[str] = solution.get("flags_financial", [])
     hint = flags_financial[0] if flags_financial else "Follow currency, jurisdiction, and payment method timelines."
     return jsonify({"flags": [hint], "ip_remaining": session["ip_remaining"]})
@@ -985,15 +3758,30 @@ def submit_guess(case_id):
     if guess_index not in [0,1,2]:
         return jsonify({"error": "image_index must be 0,1,2"}), 400
 
-    sessions_ref().child(session["session_id"]).child("status").set("finished")
-    session["status"] = "finished"
+    session, err = finish_session(session)
+    if err: return jsonify(err), 409
 
-    solution = case_ref(case_id).child("solution").get() or {}
+    solution = get_case_solution(case_id)
     answer_index = int(solution.get("answer_index", 0))
     correct = (guess_index == answer_index)
 
     summary = score_result(correct, session)
-    upsert_leaderboard(case_id, session["user_id"], session["username"], summary["score"])
+    now_iso = datetime.now(timezone.utc).isoformat()
+    play = {
+        "user_id": session["user_id"],
+        "username": session["username"],
+        "score": summary["score"],
+        "ts": now_iso,
+        "rationale": rationale,
+        "correct": correct,
+        "seconds_left": summary["seconds_left"],
+        "ip_left": summary["ip_left"],
+        "finished_at": now_iso
+    }
+
+    batch = RTDBBatch()
+    upsert_leaderboard(batch, case_id, play)
+    batch.commit()
 
     reveal = {
         "authentic_index": answer_index,
@@ -1003,15 +3791,6 @@ def submit_guess(case_id):
         "flags_financial": solution.get("flags_financial", [])
     }
 
-    plays_ref(case_id).child(session["user_id"]).update({
-        "rationale": rationale,
-        "correct": correct,
-        "score": summary["score"],
-        "seconds_left": summary["seconds_left"],
-        "ip_left": summary["ip_left"],
-        "finished_at": datetime.now(timezone.utc).isoformat()
-    })
-
     return jsonify({
         "correct": correct,
         "score": summary["score"],
@@ -1023,27 +3802,30 @@ def submit_guess(case_id):
 @app.route("/leaderboard/daily", methods=["GET"])
 def leaderboard_daily():
     case_id = utc_today_str()
-    top = leaderboard_ref(case_id).get() or []
+    top = ranked_top_rows(load_leaderboard_top(case_id))
     user_id, _ = extract_user_from_headers(request)
     me = plays_ref(case_id).child(user_id).get() or {}
-    rank = None
-    if top:
-        for i, row in enumerate(top):
-            if row.get("user_id") == user_id:
-                rank = i + 1
-                break
-    return jsonify({"case_id": case_id, "top": top, "me": {"score": me.get("score"), "rank": rank}})
+    my_score = me.get("score")
+    standing = {"rank": None, "percentile": None, "players": None}
+    if my_score is not None:
+        hist = load_score_hist(case_id)
+        if hist:
+            standing = rank_from_hist(hist, int(my_score))
+        else:
+            # Cases played before the histogram existed: only the stored top is searchable.
+            for row in top:
+                if row.get("user_id") == user_id:
+                    standing["rank"] = row["rank"]
+                    break
+    return jsonify({"case_id": case_id, "top": top, "me": {"score": my_score, **standing}})
 
 # -----------------------------------------------------------------------------
 # 7) MAIN
 # -----------------------------------------------------------------------------
 if __name__ == "__main__":
-    if os.environ.get("BOOTSTRAP_IA", "1") == "1":
-        log.info("Bootstrapping Internet Archive pool...")
-        try:
-            stats = ensure_minimum_ia_pool()
-            log.info(f"Bootstrap complete: {stats}")
-        except Exception:
-            log.exception("Bootstrap failed")
-
-    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", "7860")), debug=True)
+    # Dev server. Production is `gunicorn -c gunicorn.conf.py main:app`, which calls on_worker_fork() per worker.
+    debug = os.environ.get("FLASK_DEBUG", "1") == "1"
+    # With the reloader on, only the serving child (WERKZEUG_RUN_MAIN) warms up; the watcher stays idle.
+    if not debug or os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_warmup()
+    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", "7860")), debug=debug)
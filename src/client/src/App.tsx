@@ -1,5 +1,5 @@
 // src/client/App.tsx
-import React, { useEffect, useMemo, useState } from "react";
+import React, { useEffect, useMemo, useRef, useState } from "react";
 import {
   API_BASE,
   health,
@@ -8,7 +8,9 @@ import {
   compareMetadata,
   submitGuess,
   getDailyLeaderboard,
+  tilesInView,
 } from "./api";
+import type { ImageDerivative, ImageDerivativeSet, TileManifest } from "./types";
 
 type CasePublic = {
   case_id: string;
@@ -16,6 +18,8 @@ type CasePublic = {
   brief: string;
   images: string[];
   signature_crops: string[];
+  image_derivatives?: ImageDerivativeSet[];
+  image_tiles?: (TileManifest | null)[];
   metadata: any[];
   ledger_summary: string;
   timer_seconds: number;
@@ -42,7 +46,7 @@ export default function App() {
   const [modal, setModal] = useState<
     | null
     | { kind: "signature" | "metadata"; payload: any }
-    | { kind: "image"; src: string; label: "A" | "B" | "C" }
+    | { kind: "image"; src: string; label: "A" | "B" | "C"; tiles?: TileManifest | null }
     | {
         kind: "result";
         payload: {
@@ -83,7 +87,7 @@ export default function App() {
       }
 
       try {
-        const payload = await startToday();
+        const payload = await startToday((wait) => push(`Case warming, retrying in ${wait}s…`));
         push("startToday OK");
         const cp = payload.case as CasePublic;
         setCase(cp);
@@ -191,11 +195,11 @@ export default function App() {
                 className="imgBtn"
                 onClick={(e) => {
                   e.stopPropagation();
-                  setModal({ kind: "image", src, label });
+                  setModal({ kind: "image", src: c.image_derivatives?.[i]?.zoom?.jpeg || src, label, tiles: c.image_tiles?.[i] });
                 }}
                 aria-label={`Open image ${label} full size`}
               >
-                <img src={src} alt={`Artwork ${label}`} />
+                <ArtImage src={src} set={c.image_derivatives?.[i]} alt={`Artwork ${label}`} />
               </button>
               <figcaption>
                 <span aria-hidden>{label}</span>
@@ -261,7 +265,7 @@ export default function App() {
         <Modal onClose={() => setModal(null)}>
           {modal.kind === "signature" && <SignatureCompare crops={modal.payload} />}
           {modal.kind === "metadata" && <MetadataCompare flags={modal.payload} />}
-          {modal.kind === "image" && <ImageModal src={modal.src} label={modal.label} onClose={() => setModal(null)} />}
+          {modal.kind === "image" && <ImageModal src={modal.src} label={modal.label} tiles={modal.tiles} />}
           {modal.kind === "result" && <ResultModal data={modal.payload} />}
         </Modal>
       )}
@@ -400,13 +404,32 @@ function ResultModal({
   );
 }
 
-function ImageModal({ src, label }: { src: string; label: "A" | "B" | "C" }) {
+// Picks thumb/display renditions by viewport width; falls back to the single full-size URL.
+function ArtImage({ src, set, alt }: { src: string; set?: ImageDerivativeSet; alt: string }) {
+  const variants = [set?.thumb, set?.display].filter(Boolean) as ImageDerivative[];
+  if (!set?.display || variants.length === 0) return <img src={src} alt={alt} />;
+  const srcSet = (fmt: "jpeg" | "webp") =>
+    variants.filter((v) => v[fmt]).map((v) => `${v[fmt]} ${v.width}w`).join(", ");
+  const sizes = "(max-width: 700px) 100vw, 33vw";
+  return (
+    <picture>
+      {set.display.webp && <source type="image/webp" srcSet={srcSet("webp")} sizes={sizes} />}
+      <img src={set.display.jpeg} srcSet={srcSet("jpeg")} sizes={sizes} alt={alt} loading="lazy" />
+    </picture>
+  );
+}
+
+function ImageModal({ src, label, tiles }: { src: string; label: "A" | "B" | "C"; tiles?: TileManifest | null }) {
   return (
     <div>
       <h3 style={{ marginTop: 0 }}>Artwork {label}</h3>
-      <div className="imageWrap">
-        <img src={src} alt={`Artwork ${label} (full view)`} />
-      </div>
+      {tiles ? (
+        <DeepZoom src={src} manifest={tiles} alt={`Artwork ${label} (full view)`} />
+      ) : (
+        <div className="imageWrap">
+          <img src={src} alt={`Artwork ${label} (full view)`} />
+        </div>
+      )}
       <p style={{ marginTop: 8 }}>
         <a href={src} target="_blank" rel="noreferrer">Open original</a>
       </p>
@@ -414,6 +437,86 @@ function ImageModal({ src, label }: { src: string; label: "A" | "B" | "C" }) {
   );
 }
 
+// Zoomable view: the zoom rendition fills the frame at 1x; past that only the pyramid tiles inside the view are
+// loaded, from the smallest level that is still sharp at the current scale. Drag to pan.
+function DeepZoom({ src, manifest, alt }: { src: string; manifest: TileManifest; alt: string }) {
+  const frame = useRef<HTMLDivElement>(null);
+  const drag = useRef<{ x: number; y: number; px: number; py: number } | null>(null);
+  const [frameW, setFrameW] = useState(0);
+  const [zoom, setZoom] = useState(1);
+  const [pan, setPan] = useState({ x: 0, y: 0 }); // top-left of the view, in full-image pixels
+
+  useEffect(() => {
+    const el = frame.current;
+    if (!el) return;
+    const ro = new ResizeObserver(() => setFrameW(el.clientWidth));
+    ro.observe(el);
+    return () => ro.disconnect();
+  }, []);
+
+  const levels = useMemo(() => [...manifest.levels].sort((a, b) => a.width - b.width), [manifest]);
+  const fit = frameW / manifest.width; // screen px per image px at 1x
+  const scale = fit * zoom;
+  const maxZoom = frameW ? Math.max(1, levels[levels.length - 1].width / frameW) : 1;
+  const view = { x: pan.x, y: pan.y, w: manifest.width / zoom, h: manifest.height / zoom };
+  const want = manifest.width * scale * (globalThis.devicePixelRatio || 1);
+  const level = (levels.find((l) => l.width >= want) || levels[levels.length - 1]).level;
+  const tiles = zoom > 1 && frameW ? tilesInView(manifest, level, view) : [];
+
+  const clampPan = (p: { x: number; y: number }, z: number) => ({
+    x: Math.min(Math.max(0, p.x), manifest.width - manifest.width / z),
+    y: Math.min(Math.max(0, p.y), manifest.height - manifest.height / z),
+  });
+  const zoomTo = (z: number) => {
+    const next = Math.min(maxZoom, Math.max(1, z));
+    const cx = pan.x + view.w / 2, cy = pan.y + view.h / 2;
+    setPan(clampPan({ x: cx - manifest.width / next / 2, y: cy - manifest.height / next / 2 }, next));
+    setZoom(next);
+  };
+
+  return (
+    <div>
+      <div
+        ref={frame}
+        className="dz"
+        style={{ height: manifest.height * fit || undefined }}
+        onPointerDown={(e) => {
+          e.currentTarget.setPointerCapture(e.pointerId);
+          drag.current = { x: e.clientX, y: e.clientY, px: pan.x, py: pan.y };
+        }}
+        onPointerMove={(e) => {
+          const d = drag.current;
+          if (!d || !scale) return;
+          setPan(clampPan({ x: d.px - (e.clientX - d.x) / scale, y: d.py - (e.clientY - d.y) / scale }, zoom));
+        }}
+        onPointerUp={() => (drag.current = null)}
+        onPointerCancel={() => (drag.current = null)}
+      >
+        <img
+          src={src}
+          alt={alt}
+          draggable={false}
+          style={{ width: manifest.width * scale, transform: `translate(${-pan.x * scale}px, ${-pan.y * scale}px)` }}
+        />
+        {tiles.map((t) => (
+          <img
+            key={t.url}
+            src={t.url}
+            alt=""
+            draggable={false}
+            style={{ left: (t.x - pan.x) * scale, top: (t.y - pan.y) * scale, width: t.w * scale, height: t.h * scale }}
+          />
+        ))}
+      </div>
+      <div className="dz-tools">
+        <button onClick={() => zoomTo(zoom / 2)} disabled={zoom <= 1} aria-label="Zoom out">−</button>
+        <span>{Math.round(zoom * 100)}%</span>
+        <button onClick={() => zoomTo(zoom * 2)} disabled={zoom >= maxZoom} aria-label="Zoom in">+</button>
+      </div>
+    </div>
+  );
+}
+
 function Modal({ children, onClose }: { children: React.ReactNode; onClose: () => void }) {
   return (
     <div className="modal-bg" onClick={onClose} role="dialog" aria-modal="true">
@@ -509,6 +612,10 @@ function Styles() {
       /* large image */
       .imageWrap { width:100%; display:flex; justify-content:center; }
       .imageWrap img { width:100%; height:auto; max-width:1200px; border-radius:10px; }
+      .dz { position:relative; overflow:hidden; width:100%; max-width:1200px; margin:0 auto; border-radius:10px; background:#000; touch-action:none; cursor:grab; }
+      .dz img { position:absolute; left:0; top:0; max-width:none; user-select:none; pointer-events:none; }
+      .dz-tools { display:flex; gap:8px; align-items:center; justify-content:center; margin-top:8px; color:#9be7ff }
+      .dz-tools button { background:#222; color:#ddd; border:none; border-radius:6px; padding:6px 12px; font-weight:700 }
     `}</style>
   );
 }
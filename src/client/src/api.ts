@@ -1,4 +1,5 @@
 // src/client/api.ts
+import type { TileManifest } from "./types";
 export const API_BASE = "/api/proxy";
 
 // Debug flag: only true if you opt-in via ?debug=1 or window.__HS_DEBUG__ = true
@@ -22,7 +23,10 @@ async function fetchJSON(url: string, init?: RequestInit) {
     log("→", res.status, res.statusText);
     if (!res.ok) {
       const text = await res.text().catch(() => "");
-      throw new Error(`HTTP ${res.status} ${res.statusText} :: ${text.slice(0, 500)}`);
+      const err: any = new Error(`HTTP ${res.status} ${res.statusText} :: ${text.slice(0, 500)}`);
+      err.status = res.status;
+      err.retryAfter = Number(res.headers.get("Retry-After")) || 0;
+      throw err;
     }
     return await res.json();
   } catch (err: any) {
@@ -38,11 +42,27 @@ export async function health() {
   return fetchJSON(`${API_BASE}/health`);
 }
 
-export async function startToday() {
-  return fetchJSON(`${API_BASE}/cases/today/start`, {
-    method: "POST",
-    body: JSON.stringify({}),
-  });
+// While today's case is still being generated the backend answers 503 + Retry-After; wait and retry a few times.
+const START_MAX_ATTEMPTS = 6;
+const START_MAX_WAIT_S = 30;
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms));
+
+export async function startToday(onWarming?: (waitSeconds: number, attempt: number) => void) {
+  for (let attempt = 1; ; attempt++) {
+    try {
+      return await fetchJSON(`${API_BASE}/cases/today/start`, {
+        method: "POST",
+        body: JSON.stringify({}),
+      });
+    } catch (err: any) {
+      if (err?.status !== 503 || attempt >= START_MAX_ATTEMPTS) throw err;
+      const wait = Math.min(Math.max(err.retryAfter || 2 ** attempt, 1), START_MAX_WAIT_S);
+      log(`case warming, retry ${attempt}/${START_MAX_ATTEMPTS - 1} in ${wait}s`);
+      onWarming?.(wait, attempt);
+      await sleep(wait * 1000);
+    }
+  }
 }
 
 export async function callToolSignature(caseId: string, sessionId: string, imageIndex: number) {
@@ -73,6 +93,31 @@ export async function getDailyLeaderboard() {
   return fetchJSON(`${API_BASE}/leaderboard/daily`);
 }
 
+// Deep-zoom tiles: only the tiles intersecting the view at the chosen level, placed in full-image pixels.
+export function tilesInView(m: TileManifest, level: number, view: { x: number; y: number; w: number; h: number }) {
+  const lv = m.levels.find((l) => l.level === level);
+  if (!lv) return [];
+  const scale = lv.width / m.width; // view is in full-image pixels
+  const c0 = Math.max(0, Math.floor((view.x * scale) / m.tile_size));
+  const r0 = Math.max(0, Math.floor((view.y * scale) / m.tile_size));
+  const c1 = Math.min(lv.cols - 1, Math.floor(((view.x + view.w) * scale) / m.tile_size));
+  const r1 = Math.min(lv.rows - 1, Math.floor(((view.y + view.h) * scale) / m.tile_size));
+  const tiles: { url: string; x: number; y: number; w: number; h: number }[] = [];
+  for (let r = r0; r <= r1; r++) {
+    for (let c = c0; c <= c1; c++) {
+      const x = c * m.tile_size, y = r * m.tile_size;
+      tiles.push({
+        url: m.url_template.replace("{level}", String(level)).replace("{col}", String(c)).replace("{row}", String(r)),
+        x: x / scale,
+        y: y / scale,
+        w: (Math.min(x + m.tile_size, lv.width) - x) / scale,
+        h: (Math.min(y + m.tile_size, lv.height) - y) / scale,
+      });
+    }
+  }
+  return tiles;
+}
+
 // Compare helpers (used by the tool tray)
 export async function compareSignature(caseId: string, sessionId: string) {
   const [a, b, c] = await Promise.all([
@@ -10,6 +10,10 @@ export type CaseMetadata = {
   notes: string;
 };
 
+export type ImageDerivative = { width: number; height: number; jpeg: string; webp?: string };
+
+export type ImageDerivativeSet = Partial<Record<'thumb' | 'display' | 'zoom', ImageDerivative>>;
+
 export type CasePublic = {
   case_id: string;
   mode: 'knowledge' | 'observation';
@@ -17,6 +21,8 @@ export type CasePublic = {
   style_period: string;
   images: string[];
   signature_crops: string[];
+  image_derivatives?: ImageDerivativeSet[];
+  image_tiles?: (TileManifest | null)[];
   metadata: CaseMetadata[];
   ledger_summary: string;
   timer_seconds: number;
@@ -37,8 +43,24 @@ export type StartResponse = {
   case: CasePublic;
 };
 
+export type TileLevel = { level: number; width: number; height: number; cols: number; rows: number };
+
+export type TileManifest = {
+  format: 'jpg';
+  tile_size: number;
+  overlap: number;
+  width: number;
+  height: number;
+  min_level: number;
+  max_level: number;
+  levels: TileLevel[];
+  url_template: string;
+  tiles: number;
+};
+
 export type SignatureToolResponse = {
   crop_url: string;
+  tiles?: TileManifest | null;
   hint?: string;
   ip_remaining: number;
 };
@@ -67,10 +89,11 @@ export type LeaderboardRow = {
   username: string;
   score: number;
   ts: string;
+  rank: number; // ties share a rank, like me.rank
 };
 
 export type LeaderboardDaily = {
   case_id: string;
   top: LeaderboardRow[];
-  me: { score?: number; rank?: number | null };
+  me: { score?: number; rank?: number | null; percentile?: number | null; players?: number | null };
 };
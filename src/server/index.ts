@@ -44,7 +44,14 @@ api.post("/cases/today/start", async (req, res) => {
     if (req.headers["x-reddit-user"]) hdrs["X-Reddit-User"] = String(req.headers["x-reddit-user"]);
     if (req.headers["x-reddit-id"]) hdrs["X-Reddit-Id"] = String(req.headers["x-reddit-id"]);
     res.json(await provider.startToday(hdrs, req.body));
-  } catch (e:any) { res.status(500).json({ status:"error", message:"Failed to start case", error:e?.message }); }
+  } catch (e:any) {
+    if (e?.status === 503) {
+      // Case still generating upstream: pass the 503 + Retry-After through so the client can wait and retry.
+      if (e.retryAfter) res.set("Retry-After", String(e.retryAfter));
+      return res.status(503).json({ status:"warming", message:"Case warming", error:e?.message });
+    }
+    res.status(500).json({ status:"error", message:"Failed to start case", error:e?.message });
+  }
 });
 
 api.post("/cases/:caseId/tool/signature", async (req, res) => {
@@ -5,7 +5,12 @@ const HF_BASE = process.env.HF_BASE || "https://rairo-dev-stroke.hf.space";
 async function j(url: string, init?: RequestInit) {
   const r = await fetch(url, init);
   const t = await r.text();
-  if (!r.ok) throw new Error(`HTTP ${r.status} ${r.statusText}: ${t}`);
+  if (!r.ok) {
+    const err: any = new Error(`HTTP ${r.status} ${r.statusText}: ${t}`);
+    err.status = r.status;
+    err.retryAfter = r.headers.get("Retry-After");
+    throw err;
+  }
   return t ? JSON.parse(t) : {};
 }
 